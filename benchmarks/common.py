@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Iterable
+
+from lexicator.wikicache.PageContent import PageContent
+from lexicator.wikicache.PageRetriever import PageRetriever
+
+boilerplate = """= {{-ru-}} =
+
+=== Морфологические и синтаксические свойства ===
+{{сущ-ru|%s|м 1a}}
+
+=== Произношение ===
+{{transcription-ru|%s}}
+
+=== Семантические свойства ===
+==== Значение ====
+# {{пример|}}
+"""
+
+
+class NullRetriever(PageRetriever):
+    """A retriever that never produces anything, used to benchmark store operations in isolation"""
+
+    def find_recent_changes(self, last_change: datetime):
+        return []
+
+    def get_titles(self, source, force, progress_reporter=None):
+        return []
+
+    def get_all_titles(self, progress_reporter, exclude=None, filters=None):
+        return []
+
+    def can_refresh(self) -> bool:
+        return False
+
+
+def synthetic_title(index: int) -> str:
+    return f'слово{index:08}'
+
+
+def synthetic_pages(count: int, timestamp: datetime, start: int = 0) -> Iterable[PageContent]:
+    for idx in range(start, start + count):
+        title = synthetic_title(idx)
+        yield PageContent(
+            title=title, timestamp=timestamp, ns=0, revid=idx + 1, user='Bench',
+            content=boilerplate % (title, title), data=[[[], 'сущ-ru', {'1': title}]])
@@ -0,0 +1,64 @@
+"""Compare on-disk size and read throughput of a plain and a zstd-compressed ContentStore
+
+Usage:
+  compression.py [--pages <count>] [--dir <path>]
+  compression.py (-h | --help)
+
+Options:
+  --pages <count>  Number of synthetic pages to write. [default: 200000]
+  --dir <path>     Directory for the temporary databases. [default: _cache/bench]
+  -h --help        Show this screen.
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import NullRetriever, synthetic_pages, synthetic_title
+from lexicator.wikicache import ContentStore
+
+
+def run(directory: Path, count: int, compress: bool):
+    label = 'zstd' if compress else 'plain'
+    filename = directory / f'compression_{label}.db'
+    if filename.exists():
+        filename.unlink()
+    store = ContentStore(filename, NullRetriever(), pragmas='bulk-load',
+                         compress=['content', 'data'] if compress else None)
+    store.save_pages(synthetic_pages(count, datetime(2020, 1, 1)))
+    if compress:
+        store.migrate_compression()
+    else:
+        store.db.close()
+        store.engine.execute('VACUUM')
+        store.engine.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size = filename.stat().st_size
+
+    start = perf_counter()
+    scanned = sum(1 for _ in store.get_all())
+    scan_time = perf_counter() - start
+
+    titles = [synthetic_title(idx) for idx in range(0, count, 7)]
+    start = perf_counter()
+    looked_up = sum(1 for _ in store.get_multiple(titles))
+    lookup_time = perf_counter() - start
+
+    print(f"{label:>5}: {size / 1024 ** 2:,.1f} MB on disk, "
+          f"full scan {int(scanned / scan_time):,} pages/s, "
+          f"lookup {int(looked_up / lookup_time):,} pages/s")
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    count = int(arguments['--pages'])
+    for compress in (False, True):
+        run(directory, count, compress)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
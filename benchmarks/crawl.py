@@ -0,0 +1,67 @@
+"""Compare a full reload of raw words from the local fake API crawled as one title range and as several ranges at once
+
+Usage:
+  crawl.py [--pages <count>] [--latency <seconds>] [--partitions <count>] [--dir <path>]
+  crawl.py (-h | --help)
+
+Options:
+  --pages <count>       Number of synthetic words. [default: 20000]
+  --latency <seconds>   Simulated response time of each API request. [default: 0.2]
+  --partitions <count>  Number of title ranges crawled at once in the partitioned mode. [default: 4]
+  --dir <path>          Directory for the temporary databases. [default: _cache/bench]
+  -h --help             Show this screen.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import boilerplate
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from lexicator.consts import NS_MAIN
+from lexicator.wikicache import ContentStore, LogConfig, WiktionaryWordDownloader
+from lexicator.wikicache.WikipageDownloader import WikipageDownloader
+
+letters = 'AzабвгдеёжзийклмнопрстуфхцчшщэюяЯ'
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    # Unlike FakeCorpus.synthetic(), spread the words over many first letters, like a real Wiktionary
+    corpus = FakeCorpus()
+    for idx in range(int(arguments['--pages'])):
+        title = f'{letters[idx % len(letters)]}слово{idx:08}'
+        corpus.add_page(NS_MAIN, title, boilerplate % (title, title))
+    api = FakeApi(corpus, latency=float(arguments['--latency'])).start()
+
+    for name, downloader in (('generator', WiktionaryWordDownloader), ('allpages', WikipageDownloader)):
+        expected = None
+        for partitions in (1, int(arguments['--partitions'])):
+            filename = directory / f'crawl_{name}_{partitions}.db'
+            if filename.exists():
+                filename.unlink()
+            site = api.site()
+            if downloader is WikipageDownloader:
+                retriever = WikipageDownloader(site, NS_MAIN, log_config=LogConfig(), partitions=partitions)
+            else:
+                retriever = WiktionaryWordDownloader(site, LogConfig(), partitions=partitions)
+            store = ContentStore(filename, retriever, pragmas='safe', pipeline=2)
+            start = perf_counter()
+            store.refresh()
+            elapsed = perf_counter() - start
+            titles = [v.title for v in store.iter_rows()]
+            if expected is None:
+                expected = titles
+            elif titles != expected:
+                raise ValueError(f'{partitions} partitions stored a different set of pages')
+            print(f"{name}, {partitions} partitions: {len(titles):,} pages in {elapsed:.1f}s, "
+                  f"{int(len(titles) / elapsed):,} pages/s")
+    print(api)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
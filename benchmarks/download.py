@@ -0,0 +1,50 @@
+"""Measure WikipageDownloader.get_titles throughput against a local fake API at several concurrency levels
+
+Usage:
+  download.py [--pages <count>] [--latency <seconds>] [--maxlag-rate <rate>]
+  download.py (-h | --help)
+
+Options:
+  --pages <count>         Number of synthetic pages to download. [default: 20000]
+  --latency <seconds>     Simulated response time of each API request. [default: 0.2]
+  --maxlag-rate <rate>    Share of the requests that fail with a maxlag error. [default: 0]
+  -h --help               Show this screen.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import synthetic_title
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from lexicator.wikicache.WikipageDownloader import WikipageDownloader
+
+
+def main(arguments):
+    count = int(arguments['--pages'])
+    titles = [synthetic_title(idx) for idx in range(count)]
+    api = FakeApi(FakeCorpus.synthetic(count),
+                  latency=float(arguments['--latency']),
+                  maxlag_rate=float(arguments['--maxlag-rate'])).start()
+
+    expected = None
+    for concurrency in (1, 2, 4, 8):
+        site = api.site()
+        downloader = WikipageDownloader(site, 0, concurrency=concurrency)
+        start = perf_counter()
+        result = [v.title for v in downloader.get_titles(titles, force=False)]
+        elapsed = perf_counter() - start
+        if expected is None:
+            expected = result
+        elif result != expected:
+            raise ValueError(f'Concurrency {concurrency} returned pages in a different order')
+        print(f"concurrency {concurrency}: {int(len(result) / elapsed):,} pages/s ({elapsed:.1f}s)")
+        print(site.report())
+    print(api)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
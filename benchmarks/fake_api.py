@@ -0,0 +1,378 @@
+"""Local stand-in for the MediaWiki, Wikibase and WDQS APIs, serving a synthetic corpus
+
+Usage:
+  fake_api.py [--words <count>] [--templates <count>] [--lexemes <count>] [--port <port>]
+              [--latency <seconds>] [--maxlag-rate <rate>] [--error-rate <rate>]
+  fake_api.py (-h | --help)
+
+Options:
+  --words <count>        Number of synthetic words. [default: 10000]
+  --templates <count>    Number of additional synthetic templates. [default: 100]
+  --lexemes <count>      Number of the words that already have a lexeme. [default: 5000]
+  --port <port>          Port to listen on. [default: 8080]
+  --latency <seconds>    Delay of every response. [default: 0]
+  --maxlag-rate <rate>   Share of the requests that fail with maxlag. [default: 0]
+  --error-rate <rate>    Share of the requests that fail with HTTP 503. [default: 0]
+  -h --help              Show this screen.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from docopt import docopt
+from mwparserfromhell import parse as mw_parse
+from pywikiapi import AttrDict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import boilerplate, synthetic_title
+from lexicator.consts import NS_MAIN, NS_TEMPLATE, NS_LEXEME, NS_TEMPLATE_NAME, Q_LANGUAGE_CODES
+from lexicator.wikicache import MwSite, WikidataQueryService
+
+csrf_token = '+\\'
+re_transclusion = re.compile(r'{{([^{}|]+)')
+entity_prefix = 'http://www.wikidata.org/entity/'
+
+
+def to_ts(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+@dataclass
+class FakePage:
+    ns: int
+    title: str
+    content: str
+    revid: int
+    timestamp: str
+    redirect: str = None
+
+
+class FakeCorpus:
+    """Pages of all namespaces of the fake wikis, with revisions, recent changes, and lexeme ids"""
+
+    def __init__(self, lang_code: str = 'ru') -> None:
+        self.lang_code = lang_code
+        self.q_language = Q_LANGUAGE_CODES[lang_code]
+        self.pages: Dict[str, FakePage] = {}
+        self.recent_changes: List[dict] = []
+        self.lock = threading.Lock()
+        self.last_revid = 0
+        self.last_lexeme = 0
+
+    @staticmethod
+    def synthetic(words: int, templates: int = 0, lexemes: int = 0, lang_code: str = 'ru') -> 'FakeCorpus':
+        corpus = FakeCorpus(lang_code)
+        for name in ('сущ-ru', 'transcription-ru', '-ru-', 'Лексема в Викиданных'):
+            corpus.add_page(NS_TEMPLATE, f'Шаблон:{name}', '<includeonly>{{{1|}}}</includeonly>')
+        for idx in range(templates):
+            corpus.add_page(NS_TEMPLATE, f'Шаблон:synthetic-{idx:05}', '{{{1|}}}')
+        for idx in range(words):
+            title = synthetic_title(idx)
+            corpus.add_page(NS_MAIN, title, boilerplate % (title, title))
+            if idx < lexemes:
+                corpus.add_lexeme(title)
+        return corpus
+
+    def add_page(self, ns: int, title: str, content: str, timestamp: str = '2020-01-01T00:00:00Z') -> FakePage:
+        with self.lock:
+            self.last_revid += 1
+            page = FakePage(ns, title, content, self.last_revid, timestamp)
+            self.pages[title] = page
+            return page
+
+    def add_lexeme(self, lemma: str, data: dict = None) -> FakePage:
+        with self.lock:
+            self.last_lexeme += 1
+            lexeme_id = f'L{self.last_lexeme}'
+        data = dict(data or dict(lexicalCategory='Q1084', claims={}, forms=[], senses=[]),
+                    type='lexeme', id=lexeme_id, language=self.q_language,
+                    lemmas={self.lang_code: dict(language=self.lang_code, value=lemma)})
+        return self.add_page(NS_LEXEME, f'Lexeme:{lexeme_id}', json.dumps(data, ensure_ascii=False))
+
+    def edit(self, title: str, content: str) -> FakePage:
+        with self.lock:
+            page = self.pages[title]
+            self.last_revid += 1
+            page.content = content
+            page.revid = self.last_revid
+            page.timestamp = to_ts(datetime.utcnow())
+            self.recent_changes.append(dict(type='edit', ns=page.ns, title=title, timestamp=page.timestamp))
+            return page
+
+    def titles(self, ns: int) -> List[str]:
+        with self.lock:
+            return sorted(v.title for v in self.pages.values() if v.ns == ns)
+
+    def templates(self, title: str) -> List[str]:
+        """Templates transcluded by the page, without following the nested templates or redirects"""
+        page = self.pages.get(title)
+        if not page:
+            return []
+        names = {v.strip() for v in re_transclusion.findall(page.content)}
+        prefix = NS_TEMPLATE_NAME[self.lang_code]
+        return sorted(v if v.startswith(prefix) else prefix + v
+                      for v in names if v and not v.startswith('#'))
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    server: 'FakeApi'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.dispatch(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.dispatch(urlparse(self.path).path, parse_qs(self.rfile.read(length).decode('utf-8')))
+
+    def dispatch(self, path: str, params: Dict[str, list]):
+        params = {k: v[0] for k, v in params.items()}
+        api = self.server
+        with api.lock:
+            api.request_count += 1
+            dice = api.random.random()
+        if api.latency:
+            time.sleep(api.latency)
+        if dice < api.error_rate:
+            api.error_count += 1
+            self.send_body(503, b'Service Unavailable', 'text/plain')
+        elif dice < api.error_rate + api.maxlag_rate:
+            api.maxlag_count += 1
+            self.send_json(dict(error=dict(code='maxlag', info='Waiting for a database server', lag=1)),
+                           {'MediaWiki-API-Error': 'maxlag', 'Retry-After': str(api.retry_after)})
+        elif path == '/sparql':
+            self.send_json(dict(head=dict(vars=[]), results=dict(bindings=api.sparql(params.get('query', '')))))
+        else:
+            action = params.get('action')
+            handler = getattr(api, f'action_{action}', None)
+            if not handler:
+                self.send_json(dict(error=dict(code='badvalue', info=f'Unsupported action {action}')),
+                               {'MediaWiki-API-Error': 'badvalue'})
+                return
+            try:
+                self.send_json(handler(params))
+            except KeyError as err:
+                self.send_json(dict(error=dict(code='missingtitle', info=str(err))),
+                               {'MediaWiki-API-Error': 'missingtitle'})
+
+    def send_json(self, data: dict, headers: Dict[str, str] = None):
+        self.send_body(200, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                       'application/json; charset=utf-8', headers)
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeApi(ThreadingHTTPServer):
+    """
+    Serves the subset of the APIs used by lexicator from a FakeCorpus: action=query with info, revisions,
+    allpages (also as a generator), embeddedin, templates, recentchanges, tokens and userinfo, action=parse with templatesandbox,
+    action=edit, action=wbeditentity, and a WDQS SPARQL endpoint at /sparql that understands the lexeme queries.
+    The same server can act as both the wiktionary and the wikidata site.
+    Responses can be delayed, and a share of the requests can fail with maxlag or HTTP 503."""
+
+    daemon_threads = True
+
+    def __init__(self, corpus: FakeCorpus, port: int = 0, latency: float = 0.0, maxlag_rate: float = 0.0,
+                 error_rate: float = 0.0, retry_after: float = 0.5, seed: int = 0) -> None:
+        super().__init__(('127.0.0.1', port), FakeApiHandler)
+        self.corpus = corpus
+        self.latency = latency
+        self.maxlag_rate = maxlag_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.maxlag_count = 0
+        self.error_count = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/w/api.php'
+
+    def start(self) -> 'FakeApi':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def site(self, **kwargs) -> MwSite:
+        return MwSite(self.url, lang_code=self.corpus.lang_code, json_object_hook=AttrDict, **kwargs)
+
+    def wdqs(self) -> WikidataQueryService:
+        wdqs = WikidataQueryService()
+        wdqs.rdf_url = f'http://127.0.0.1:{self.server_address[1]}/sparql'
+        return wdqs
+
+    def __str__(self) -> str:
+        return (f"Fake API at {self.url} served {self.request_count:,} requests, "
+                f"{self.maxlag_count:,} with maxlag and {self.error_count:,} with errors")
+
+    def action_login(self, params: Dict[str, str]) -> dict:
+        return dict(login=dict(result='Success', lgusername=params.get('lgname')))
+
+    def action_query(self, params: Dict[str, str]) -> dict:
+        result = {}
+        response = dict(batchcomplete=True, query=result)
+        if params.get('meta') == 'userinfo':
+            result['userinfo'] = dict(id=1, name='Bench', rights=['bot'])
+        elif params.get('meta') == 'tokens':
+            result['tokens'] = {f"{params.get('type', 'csrf')}token": csrf_token}
+        elif params.get('list') == 'allpages':
+            titles, cont = self.page_range(params, 'ap')
+            result['allpages'] = [dict(ns=self.corpus.pages[v].ns, title=v) for v in titles]
+            if cont:
+                response['continue'] = dict(apcontinue=cont, **{'continue': '-||'})
+        elif params.get('list') == 'embeddedin':
+            titles, cont = self.embedded_in(params)
+            result['embeddedin'] = [dict(ns=self.corpus.pages[v].ns, title=v) for v in titles]
+            if cont:
+                response['continue'] = dict(eicontinue=cont, **{'continue': '-||'})
+        elif params.get('list') == 'recentchanges':
+            result['recentchanges'] = self.recent_changes(params)
+        elif params.get('generator') == 'allpages':
+            titles, cont = self.page_range(params, 'gap')
+            result['pages'] = self.page_info(titles, params)
+            if cont:
+                response['continue'] = dict(gapcontinue=cont, **{'continue': 'gapcontinue||'})
+        elif 'titles' in params:
+            result['pages'] = self.page_info(params['titles'].split('|'), params)
+        return response
+
+    def page_range(self, params: Dict[str, str], prefix: str):
+        limit = params.get(f'{prefix}limit', '10')
+        limit = 500 if limit == 'max' else int(limit)
+        start = params.get(f'{prefix}continue') or params.get(f'{prefix}from') or ''
+        end = params.get(f'{prefix}to')
+        titles = [v for v in self.corpus.titles(int(params.get(f'{prefix}namespace', 0)))
+                  if v >= start and (not end or v <= end)]
+        if params.get(f'{prefix}filterredir') == 'nonredirects':
+            titles = [v for v in titles if not self.corpus.pages[v].redirect]
+        return titles[:limit], titles[limit] if len(titles) > limit else None
+
+    def embedded_in(self, params: Dict[str, str]):
+        limit = params.get('eilimit', '10')
+        limit = 500 if limit == 'max' else int(limit)
+        start = params.get('eicontinue', '')
+        template = params['eititle']
+        titles = [v for v in self.corpus.titles(int(params.get('einamespace', 0)))
+                  if v >= start and template in self.corpus.templates(v)]
+        return titles[:limit], titles[limit] if len(titles) > limit else None
+
+    def page_info(self, titles: List[str], params: Dict[str, str]) -> List[dict]:
+        props = set(params.get('prop', '').split('|'))
+        pages = []
+        for title in titles:
+            page = self.corpus.pages.get(title)
+            if not page:
+                pages.append(dict(ns=NS_MAIN, title=title, missing=True))
+                continue
+            value = dict(pageid=abs(hash(title)) % 10 ** 8, ns=page.ns, title=title)
+            if 'info' in props:
+                value.update(lastrevid=page.revid, length=len(page.content))
+                if page.redirect:
+                    value['redirect'] = True
+            if 'templates' in props:
+                value['templates'] = [dict(ns=NS_TEMPLATE, title=v) for v in self.corpus.templates(title)]
+            if 'revisions' in props:
+                value['revisions'] = [dict(revid=page.revid, user='Bench', timestamp=page.timestamp,
+                                           slots=dict(main=dict(contentmodel='wikitext', content=page.content)))]
+            pages.append(value)
+        return pages
+
+    def recent_changes(self, params: Dict[str, str]) -> List[dict]:
+        start = params.get('rcstart', '')
+        types = set(params.get('rctype', 'edit|new|log').split('|'))
+        namespaces = {int(v) for v in params['rcnamespace'].split('|')} if 'rcnamespace' in params else None
+        with self.corpus.lock:
+            changes = list(self.corpus.recent_changes)
+        return [v for v in changes if v['timestamp'] >= start and v['type'] in types
+                and (namespaces is None or v['ns'] in namespaces)]
+
+    def action_parse(self, params: Dict[str, str]) -> dict:
+        # Instead of expanding the templates, list their parameters in the format the sandbox template produces
+        items = []
+        for line in params.get('text', '').split('\n'):
+            if line.startswith('* _INDEX_='):
+                items.append(f"<li>_INDEX_={line[len('* _INDEX_='):]}</li>")
+            else:
+                for template in mw_parse(line).filter_templates(recursive=False):
+                    for param in template.params:
+                        items.append(f'<li>{str(param.name).strip()}={str(param.value).strip()}</li>')
+        return dict(parse=dict(title='API', pageid=0, text=f"<ul>{''.join(items)}</ul>"))
+
+    def check_token(self, params: Dict[str, str]) -> None:
+        if params.get('token') != csrf_token:
+            raise KeyError('Invalid CSRF token')
+
+    def action_edit(self, params: Dict[str, str]) -> dict:
+        self.check_token(params)
+        title = params['title']
+        if title in self.corpus.pages:
+            page = self.corpus.edit(title, params['text'])
+        elif 'nocreate' in params:
+            raise KeyError(title)
+        else:
+            page = self.corpus.add_page(NS_MAIN, title, params['text'], to_ts(datetime.utcnow()))
+        return dict(edit=dict(result='Success', title=title, newrevid=page.revid, newtimestamp=page.timestamp))
+
+    def action_wbeditentity(self, params: Dict[str, str]) -> dict:
+        self.check_token(params)
+        data = json.loads(params['data'])
+        lemma = data.get('lemmas', {}).get(self.corpus.lang_code, {}).get('value', '')
+        if 'id' in params:
+            page = self.corpus.edit(f"Lexeme:{params['id']}", json.dumps(
+                dict(data, type='lexeme', id=params['id']), ensure_ascii=False))
+        else:
+            page = self.corpus.add_lexeme(lemma, data)
+        return dict(success=1, entity=dict(json.loads(page.content), lastrevid=page.revid))
+
+    def sparql(self, query: str) -> List[dict]:
+        since = re.search(r'\?ts >= "([^"]+)"', query)
+        since = since.group(1) if since else ''
+        with_lemma = 'wikibase:lemma' in query
+        with self.corpus.lock:
+            pages = [v for v in self.corpus.pages.values() if v.ns == NS_LEXEME and v.timestamp >= since]
+        result = []
+        for page in pages:
+            row = dict(lexemeId=dict(type='uri', value=entity_prefix + page.title[len('Lexeme:'):]),
+                       ts=dict(type='literal', value=page.timestamp))
+            if with_lemma:
+                lemma = json.loads(page.content)['lemmas'][self.corpus.lang_code]['value']
+                row['lemma'] = dict(type='literal', value=lemma)
+            result.append(row)
+        return result
+
+
+def main(arguments):
+    corpus = FakeCorpus.synthetic(int(arguments['--words']), int(arguments['--templates']),
+                                  int(arguments['--lexemes']))
+    api = FakeApi(corpus, port=int(arguments['--port']), latency=float(arguments['--latency']),
+                  maxlag_rate=float(arguments['--maxlag-rate']), error_rate=float(arguments['--error-rate']))
+    print(f"Serving {len(corpus.pages):,} pages at {api.url}, SPARQL at /sparql")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        print(api)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
@@ -0,0 +1,48 @@
+"""Compare a sequential and a pipelined full ContentStore.refresh() of raw words from the local fake API
+
+Usage:
+  refresh.py [--pages <count>] [--latency <seconds>] [--pipeline <depth>] [--dir <path>]
+  refresh.py (-h | --help)
+
+Options:
+  --pages <count>      Number of synthetic words. [default: 20000]
+  --latency <seconds>  Simulated response time of each API request. [default: 0.2]
+  --pipeline <depth>   Number of downloaded batches queued for saving in the pipelined mode. [default: 2]
+  --dir <path>         Directory for the temporary databases. [default: _cache/bench]
+  -h --help            Show this screen.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from lexicator.wikicache import ContentStore, LogConfig
+from lexicator.wikicache.WikipageDownloader import WikipageDownloader
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    api = FakeApi(FakeCorpus.synthetic(int(arguments['--pages'])), latency=float(arguments['--latency'])).start()
+
+    for pipeline in (0, int(arguments['--pipeline'])):
+        filename = directory / f'refresh_{pipeline}.db'
+        if filename.exists():
+            filename.unlink()
+        # The generic downloader lists all titles first and then downloads them in batches
+        store = ContentStore(filename, WikipageDownloader(api.site(), 0, log_config=LogConfig()),
+                             pragmas='safe', pipeline=pipeline)
+        start = perf_counter()
+        store.refresh()
+        elapsed = perf_counter() - start
+        count = sum(1 for _ in store.iter_rows())
+        print(f"pipeline {pipeline}: {count:,} pages in {elapsed:.1f}s, {int(count / elapsed):,} pages/s")
+    print(api)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
@@ -0,0 +1,52 @@
+"""Compare ContentStore.save_pages write paths on a synthetic store
+
+Usage:
+  save_pages.py [--pages <count>] [--batch <size>] [--pragmas <profile>] [--dir <path>]
+  save_pages.py (-h | --help)
+
+Options:
+  --pages <count>      Number of synthetic pages to write. [default: 1000000]
+  --batch <size>       Number of pages per transaction. [default: 200]
+  --pragmas <profile>  Sqlite pragma profile of the store, "safe" or "bulk-load". [default: safe]
+  --dir <path>         Directory for the temporary databases. [default: _cache/bench]
+  -h --help            Show this screen.
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import NullRetriever, synthetic_pages
+from lexicator.wikicache import ContentStore
+
+
+def run(directory: Path, count: int, batch_size: int, bulk_save: bool, pragmas: str):
+    filename = directory / f"save_pages_{'bulk' if bulk_save else 'orm'}.db"
+    if filename.exists():
+        filename.unlink()
+    store = ContentStore(filename, NullRetriever(), batch_size=batch_size, bulk_save=bulk_save,
+                         pragmas=pragmas)
+    timestamp = datetime(2020, 1, 1)
+    for label, ts in (('insert', timestamp), ('update', timestamp + timedelta(days=1))):
+        start = perf_counter()
+        store.save_pages(synthetic_pages(count, ts))
+        elapsed = perf_counter() - start
+        print(f"{'bulk' if bulk_save else 'orm':>4} {label}: {count:,} pages in {elapsed:.1f}s, "
+              f"{int(count / elapsed):,} pages/s")
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    count = int(arguments['--pages'])
+    batch_size = int(arguments['--batch'])
+    for bulk_save in (False, True):
+        run(directory, count, batch_size, bulk_save, arguments['--pragmas'])
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
@@ -0,0 +1,95 @@
+"""Measure the page parsing time of the tokenizer by page size, building the whole page or only the {{-ru-}} sections
+
+Usage:
+  sections.py [--pages <count>] [--dir <path>]
+  sections.py (-h | --help)
+
+Options:
+  --pages <count>  Number of synthetic words. [default: 1000]
+  --dir <path>     Directory for the temporary databases. [default: _cache/bench]
+  -h --help        Show this screen.
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from docopt import docopt
+from mwparserfromhell import parse as mw_parse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import NullRetriever, boilerplate, synthetic_title
+from lexicator.tokenizer import PageTokenizer
+from lexicator.tokenizer.SectionParser import SectionParser
+from lexicator.wikicache import ContentStore, LogConfig
+from lexicator.wikicache.PageContent import PageContent
+
+languages = ['en', 'de', 'fr', 'it', 'es', 'pl', 'cs', 'uk', 'be', 'bg', 'sr', 'la', 'fi', 'nl', 'sv', 'tr']
+
+# Another language's section, with markup that looks like a level-1 heading but is not one at the top level
+foreign = """= {{-%s-}} =
+
+=== Морфологические и синтаксические свойства ===
+{{сущ %s|%s|м 1a}}
+{{пример|
+= не заголовок =
+}}
+<!--
+= закомментировано =
+-->
+<nowiki>
+= без разметки =
+</nowiki>
+{| class="wikitable"
+| [[%s]] || ''курсив'' &amp; [https://example.org ссылка]
+|}
+
+==== Значение ====
+# {{помета|книжн.}} [[слово]]<ref>{{книга|автор=А. Б.|заглавие=В}}</ref>
+"""
+
+
+def make_page(idx: int, timestamp: datetime) -> PageContent:
+    title = synthetic_title(idx)
+    before = [foreign % (lang, lang, title, title) for lang in languages[:(idx * 7) % len(languages)]]
+    after = [foreign % (lang, lang, title, title) for lang in languages[:(idx * 3) % 5]]
+    ru = boilerplate % (title, title)
+    if idx % 10 == 0:
+        ru += '\n' + ru  # a page with two {{-ru-}} sections
+    return PageContent(title=title, ns=0, timestamp=timestamp, content=''.join(before) + ru + ''.join(after))
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    count = int(arguments['--pages'])
+
+    filename = directory / 'sections_templates.db'
+    if filename.exists():
+        filename.unlink()
+    templates = ContentStore(filename, NullRetriever())
+    timestamp = datetime(2020, 1, 1)
+    pages = [make_page(idx, timestamp) for idx in range(count)]
+
+    full = PageTokenizer('ru', None, templates, LogConfig(print_warnings=False))
+    full.section_parser = SectionParser(None)
+    sliced = PageTokenizer('ru', None, templates, LogConfig(print_warnings=False))
+    for page in pages:
+        expected = mw_parse(page.content).get_sections(levels=[1], matches=full.re_section_headers)
+        actual = sliced.section_parser.parse(page.content).get_sections(levels=[1], matches=full.re_section_headers)
+        if [str(v) for v in actual] != [str(v) for v in expected]:
+            raise ValueError(f'Sections of {page.title} differ')
+    sliced.section_parser = SectionParser(sliced.re_section_headers)
+
+    expected = None
+    for label, tokenizer in (('whole page', full), ('{{-ru-}} sections only', sliced)):
+        data = [(v.data, v.content) for v in (tokenizer.process_page(page, False) for page in pages)]
+        if expected is None:
+            expected = data
+        elif data != expected:
+            raise ValueError(f'Tokenizing the {label} produced a different result')
+        print(f'{label}: {tokenizer.section_parser}')
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
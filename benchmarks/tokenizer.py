@@ -0,0 +1,87 @@
+"""Measure the tokenizer CPU time on a fixed synthetic corpus of nouns that use inflection templates,
+parsing the templates every time, reusing their parse trees, and also reusing the expansions
+
+Usage:
+  tokenizer.py [--pages <count>] [--stems <count>] [--dir <path>]
+  tokenizer.py (-h | --help)
+
+Options:
+  --pages <count>  Number of synthetic words. [default: 2000]
+  --stems <count>  Number of distinct template arguments used by the words. [default: 200]
+  --dir <path>     Directory for the temporary databases. [default: _cache/bench]
+  -h --help        Show this screen.
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import process_time
+
+from docopt import docopt
+from mwparserfromhell import parse as mw_parse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import NullRetriever, boilerplate, synthetic_title
+from lexicator.consts import NS_TEMPLATE
+from lexicator.tokenizer import PageTokenizer
+from lexicator.tokenizer.ExpansionCache import ExpansionCache
+from lexicator.wikicache import ContentStore, LogConfig
+from lexicator.wikicache.PageContent import PageContent
+
+# An inflection table in the style of the real ones: case endings chosen by nested #switch and #if
+cases = ['nom-sg', 'nom-pl', 'gen-sg', 'gen-pl', 'dat-sg', 'dat-pl', 'acc-sg', 'acc-pl', 'ins-sg', 'ins-pl',
+         'prp-sg', 'prp-pl']
+inflection = '{{сущ-ru|{{{1}}}|{{{2|м 1a}}}|' + '|'.join(
+    f"{case}={{{{{{1}}}}}}{{{{#switch:{{{{{{3|a}}}}}}|a={{{{ending|{case}|{{{{{{2|}}}}}}}}}}"
+    f"|b={{{{#if:{{{{{{4|}}}}}}|{{{{{{4}}}}}}|{{{{ending|{case}|b}}}}}}}}|#default=?}}}}"
+    for case in cases) + '}}'
+ending = '{{#switch:{{{1}}}|' + '|'.join(f'{case}=-{idx}' for idx, case in enumerate(cases)) + '|#default=}}'
+
+
+class ReparsingTokenizer(PageTokenizer):
+    """Parses the template wikitext on every use, like before the parse trees were cached"""
+
+    def parse_template(self, template: PageContent):
+        return mw_parse(template.content)
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    count, stems = int(arguments['--pages']), int(arguments['--stems'])
+
+    filename = directory / 'tokenize_templates.db'
+    if filename.exists():
+        filename.unlink()
+    templates = ContentStore(filename, NullRetriever())
+    timestamp = datetime(2020, 1, 1)
+    templates.save_pages(PageContent(title=f'Шаблон:{name}', ns=NS_TEMPLATE, content=content, timestamp=timestamp)
+                         for name, content in (('сущ ru m a', inflection), ('ending', ending)))
+
+    pages = []
+    for idx in range(count):
+        title = synthetic_title(idx)
+        call = f"{{{{сущ ru m a|корень{idx % stems}|м 1a|{'ab'[idx % 2]}}}}}"
+        pages.append(PageContent(title=title, ns=0, timestamp=timestamp,
+                                 content=(boilerplate % (title, title)).replace(f'{{{{сущ-ru|{title}|м 1a}}}}', call)))
+
+    expected = None
+    for label, tokenizer_class, expansion_size in (('parse every time', ReparsingTokenizer, 0),
+                                                   ('cached parse trees', PageTokenizer, 0),
+                                                   ('cached parse trees and expansions', PageTokenizer, 100000)):
+        tokenizer = tokenizer_class('ru', None, templates, LogConfig(print_warnings=False))
+        tokenizer.expansions = ExpansionCache(expansion_size)
+        start = process_time()
+        result = [tokenizer.process_page(page, False) for page in pages]
+        elapsed = process_time() - start
+        data = [(v.data, v.content) for v in result]
+        if expected is None:
+            expected = data
+        elif data != expected:
+            raise ValueError(f'Tokenizing with {label} produced a different result')
+        print(f"{label}: {count:,} pages in {elapsed:.2f}s CPU, {int(count / elapsed):,} pages/s")
+    print(tokenizer.expansions)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
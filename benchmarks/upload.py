@@ -0,0 +1,97 @@
+"""Measure the resolver and the uploaders against the local fake API: resolving {{сущ-ru}} through action=parse,
+creating lexemes with WikidataUploader, and linking them from the words with UpdateWiktionaryWithLexemeId
+
+Usage:
+  upload.py [--words <count>] [--latency <seconds>] [--maxlag-rate <rate>] [--dir <path>]
+  upload.py (-h | --help)
+
+Options:
+  --words <count>        Number of words resolved, and of the lexemes created and linked. [default: 300]
+  --latency <seconds>    Simulated response time of each API request. [default: 0.05]
+  --maxlag-rate <rate>   Share of the requests that fail with a maxlag error. [default: 0]
+  --dir <path>           Directory for the temporary databases. [default: _cache/bench]
+  -h --help              Show this screen.
+"""
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from docopt import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from benchmarks.common import synthetic_title
+from lexicator.consts import NS_LEXEME, Q_LANGUAGE_CODES, Q_PART_OF_SPEECH
+from lexicator.lexemer.ru import RuResolveNoun
+from lexicator.uploader import UpdateWiktionaryWithLexemeId, WikidataUploader
+from lexicator.uploader.UpdateWiktionaryWithLexemeId import format_lex_ref
+from lexicator.wikicache import ContentStore, LexemeDownloader, LogConfig, WiktionaryWordDownloader, json_key
+from lexicator.wikicache.PageContent import PageContent
+
+
+def report(label: str, count: int, elapsed: float, api: FakeApi, requests: int):
+    print(f"{label}: {count:,} in {elapsed:.1f}s, {count / elapsed:.1f}/s, "
+          f"{api.request_count - requests:,} API requests")
+
+
+def main(arguments):
+    directory = Path(arguments['--dir'])
+    directory.mkdir(exist_ok=True, parents=True)
+    count = int(arguments['--words'])
+    # The first half of the words already have lexemes that the words do not link to yet
+    corpus = FakeCorpus.synthetic(count * 2, lexemes=count)
+    api = FakeApi(corpus, latency=float(arguments['--latency']),
+                  maxlag_rate=float(arguments['--maxlag-rate'])).start()
+    log_config = LogConfig(print_warnings=False)
+    site = api.site()
+
+    # Resolve the inflection templates of all words
+    resolver = RuResolveNoun(log_config, site, None)
+    keys = [json_key('сущ-ru', {'1': synthetic_title(idx), '2': 'м 1a'}) for idx in range(count)]
+    requests, start = api.request_count, perf_counter()
+    resolved = list(resolver.get_titles(keys, False))
+    report('resolved templates', len(resolved), perf_counter() - start, api, requests)
+    for key, page in zip(keys, resolved):
+        if page.title != key or page.data != json.loads(key)['сущ-ru']:
+            raise ValueError(f'Template {key} was resolved as {page}')
+
+    stores = []
+    for name, retriever in (('words', WiktionaryWordDownloader(site, log_config)),
+                            ('lexemes', LexemeDownloader(site, api.wdqs(), 'ru', log_config))):
+        filename = directory / f'upload_{name}.db'
+        if filename.exists():
+            filename.unlink()
+        stores.append(ContentStore(filename, retriever))
+    words, lexemes = stores
+
+    # Link the existing lexemes from their words: refresh both stores, then edit every word
+    updater = UpdateWiktionaryWithLexemeId(log_config, words, lexemes, site)
+    requests, start = api.request_count, perf_counter()
+    updater.run()
+    report('linked existing lexemes', count, perf_counter() - start, api, requests)
+
+    # Create a lexeme for each of the remaining words, and link it from the word
+    uploader = WikidataUploader(site, None, lexemes, updater)
+    titles = [synthetic_title(idx) for idx in range(count, count * 2)]
+    requests, start = api.request_count, perf_counter()
+    for title in titles:
+        page = PageContent(title=title, data=[dict(
+            lemmas={'ru': dict(language='ru', value=title)}, language=Q_LANGUAGE_CODES['ru'],
+            lexicalCategory=Q_PART_OF_SPEECH['noun'], claims={}, forms=[], senses=[])])
+        # The same per-word step as WikidataUploader.run(), without the desired lexemes pipeline
+        uploader._run_one_page(title, page)
+    report('created and linked lexemes', count, perf_counter() - start, api, requests)
+
+    linked = [v for v in corpus.titles(0) if '{{Лексема в Викиданных|' in corpus.pages[v].content]
+    if len(linked) != count * 2 or len(corpus.titles(NS_LEXEME)) != count * 2:
+        raise ValueError(f'{len(linked):,} words link to {len(corpus.titles(NS_LEXEME)):,} lexemes')
+    for title in linked:
+        if corpus.pages[title].content.count(format_lex_ref('')[:-2]) != 1:
+            raise ValueError(f'{title} links to more than one lexeme')
+    print(api)
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
@@ -2,16 +2,30 @@
 
 Usage:
   lexicator.py [-p <word>]...
-  lexicator.py [-r <generator>]...
+  lexicator.py [-c <count>] [--targeted [--delete-untargeted]] [-r <generator>]...
+  lexicator.py [-z <generator>]...
+  lexicator.py [-d <dump> [-i <index>]]
+  lexicator.py [-l <dump>]
   lexicator.py [-v <word>]
   lexicator.py [-u <user>]
+  lexicator.py (--record <cassette> | --replay <cassette> [--latency <seconds>]) [-c <count>] [-r <generator>]...
   lexicator.py (-h | --help)
 
 Options:
   -p --parse <word>        Test-parse one or more words, checks the cache first.
   -r --refresh <generator> Reset and regenerate cached values for one or more generators.
+  -c --concurrency <count>  Number of page batches downloaded at once from each site. [default: 4]
+  --targeted               Download only the words that embed the root templates, not all of them.
+  --delete-untargeted      With --targeted, delete the stored words that do not embed the root templates.
+  -z --compress <generator>  Train compression dictionaries and compress all stored pages of the generators.
+  -d --dump <dump>         Load raw words and templates from a local pages-articles.xml.bz2 dump.
+  -i --index <index>       Multistream index of the dump, to read it in parallel.
+  -l --lexemes <dump>      Load existing lexemes from a local latest-lexemes.json.bz2 dump.
   -v --validate <word>     Validate a single word. If <word> is a '*', validates all of them.
   -u --user <user>         Bot user name.  The password should be in ./password file. [default: YurikBot@lexicator]
+  --record <cassette>      Record all API and WDQS responses into a local cassette file.
+  --replay <cassette>      Replay the API and WDQS responses from a cassette file instead of the network.
+  --latency <seconds>      Simulated response time when replaying. [default: 0]
   -h --help                Show this screen.
 """
 from pathlib import Path
@@ -21,12 +35,19 @@ from docopt import docopt
 from lexicator.Config import Config
 from lexicator.Storage import Storage
 from lexicator.Validator import Validator
-from lexicator.wikicache import to_json
+from lexicator.wikicache import to_json, Cassette
 
 
 def main(arguments):
 
-    config = Config('ru', 'YurikBot@lexicator', Path('./.password'))
+    cassette = None
+    if arguments['--record']:
+        cassette = Cassette(Path(arguments['--record']), 'record')
+    elif arguments['--replay']:
+        cassette = Cassette(Path(arguments['--replay']), 'replay', latency=float(arguments['--latency']))
+    config = Config('ru', 'YurikBot@lexicator', Path('./.password'), cassette=cassette,
+                    concurrency=int(arguments['--concurrency']), targeted=arguments['--targeted'],
+                    delete_untargeted=arguments['--delete-untargeted'])
 
     password_file = Path('./password')
     if password_file.is_file():
@@ -36,6 +57,12 @@ def main(arguments):
         print(f"Password file {password_file.absolute()} does not exist. Wikidata writing is disabled.")
 
     caches = Storage(config)
+    if arguments['--dump']:
+        caches.import_dump(Path(arguments['--dump']),
+                           Path(arguments['--index']) if arguments['--index'] else None)
+    if arguments['--lexemes']:
+        caches.import_lexemes_dump(Path(arguments['--lexemes']))
+
     generators = list(caches.__dict__.keys())
     for gen in arguments['--refresh']:
         if gen not in generators:
@@ -43,6 +70,15 @@ def main(arguments):
         else:
             caches.__dict__[gen].refresh()
 
+    compressed = [k for k, v in caches.__dict__.items() if getattr(v, 'compressor', None)]
+    for gen in arguments['--compress']:
+        if gen not in generators:
+            print(f"Generator {gen} is unrecognized. Available generators: {', '.join(generators)}")
+        elif gen not in compressed:
+            print(f"Generator {gen} is not compressed. Compressed generators: {', '.join(compressed)}")
+        else:
+            caches.__dict__[gen].migrate_compression(retrain=True)
+
     words_to_do = arguments['--parse']
     if words_to_do:
         caches.wiki_words.get(words_to_do)
@@ -69,6 +105,9 @@ def main(arguments):
 
         Validator(caches.parsed_wiki_words.get(), todo).run()
 
+    if cassette:
+        print(cassette)
+
 
 if __name__ == '__main__':
     main(docopt(__doc__))
@@ -6,7 +6,7 @@ from pywikiapi import AttrDict
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from lexicator.wikicache import WikidataQueryService, LogConfig, MwSite
+from lexicator.wikicache import WikidataQueryService, LogConfig, MwSite, Cassette
 
 
 class Config(LogConfig):
@@ -20,25 +20,39 @@ class Config(LogConfig):
                  password: Union[Path, str],
                  print_warnings: bool = True,
                  verbose: bool = False,
+                 cassette: Cassette = None,
+                 concurrency: int = 4,
+                 targeted: bool = False,
+                 delete_untargeted: bool = False,
                  ) -> None:
         super().__init__()
         self.print_warnings = print_warnings
         self.verbose = verbose
-        self.wiktionary = get_site(f'{lang_code}.wiktionary.org', user, password)
-        self.wikidata = get_site('www.wikidata.org', user, password)
-        self.wdqs = WikidataQueryService()
-
-
-def get_site(host: str, username: str, password: Union[Path, str], max_lag: int = 5) -> MwSite:
+        self.cassette = cassette
+        # Number of page batches each downloader keeps in flight, also the limit of parallel requests per site
+        self.concurrency = concurrency
+        # Download only the words that embed the root templates, and optionally delete the other stored words
+        self.targeted = targeted
+        self.delete_untargeted = delete_untargeted
+        self.wiktionary = get_site(f'{lang_code}.wiktionary.org', user, password, cassette=cassette,
+                                   max_parallel=concurrency)
+        self.wikidata = get_site('www.wikidata.org', user, password, cassette=cassette, max_parallel=concurrency)
+        self.wdqs = WikidataQueryService(cassette.session() if cassette else None)
+
+
+def get_site(host: str, username: str, password: Union[Path, str], max_lag: int = 5,
+             cassette: Cassette = None, max_parallel: int = 4) -> MwSite:
     retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
     session = requests.Session()
-    session.mount('https://', HTTPAdapter(max_retries=retries))
+    session.mount('https://', cassette.adapter(max_retries=retries) if cassette else HTTPAdapter(max_retries=retries))
 
     lang_code = host.split('.')[0] if '.wiktionary.' in host else None
     site = MwSite(f'https://{host}/w/api.php',
                   lang_code=lang_code,
                   session=session,
-                  json_object_hook=AttrDict)
+                  json_object_hook=AttrDict,
+                  max_parallel=max_parallel,
+                  cassette=cassette)
 
     if isinstance(password, Path):
         password = password.read_text().strip()
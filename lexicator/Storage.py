@@ -4,7 +4,8 @@ from lexicator.lexemer.PageToLexemsFilter import PageToLexemsFilter
 from lexicator.tokenizer import PageTokenizer
 from lexicator.uploader import UpdateWiktionaryWithLexemeId, WikidataUploader
 from lexicator.Config import Config
-from lexicator.wikicache import ContentStore, LexemeDownloader, TemplateDownloader, WiktionaryWordDownloader
+from lexicator.wikicache import ContentStore, LexemeDownloader, TemplateDownloader, WiktionaryWordDownloader, \
+    import_xml_dump, MultistreamDumpReader, LexemeDumpReader, import_lexeme_dump
 
 
 class Storage:
@@ -15,24 +16,47 @@ class Storage:
         log_config = config
         self.wiki_templates = ContentStore(
             path / 'wiktionary-raw-templates.db',
-            TemplateDownloader(config.wiktionary, log_config=log_config))
+            TemplateDownloader(config.wiktionary, log_config=log_config, concurrency=config.concurrency),
+            pragmas='bulk-load', check_revisions=True, pipeline=2)
         self.wiki_words = ContentStore(
             path / 'wiktionary-raw-words.db',
-            WiktionaryWordDownloader(config.wiktionary, log_config))
+            WiktionaryWordDownloader(config.wiktionary, log_config, partitions=4,
+                                     templates=self.wiki_templates if config.targeted else None,
+                                     concurrency=config.concurrency, delete_untargeted=config.delete_untargeted),
+            pragmas='bulk-load', compress=['content'], check_revisions=True, pipeline=2)
         self.existing_lexemes = ContentStore(
             path / 'wikidata-raw-lexemes.db',
-            LexemeDownloader(config.wikidata, config.wdqs, config.wiktionary.lang_code, log_config))
+            LexemeDownloader(config.wikidata, config.wdqs, config.wiktionary.lang_code, log_config,
+                             concurrency=config.concurrency),
+            pragmas='bulk-load', compress=['content'], check_revisions=True, pipeline=2)
         self.parsed_wiki_words = ContentStore(
             path / 'parsed.wiktionary.db',
-            PageTokenizer(config.wiktionary.lang_code, self.wiki_words, self.wiki_templates, log_config))
+            PageTokenizer(config.wiktionary.lang_code, self.wiki_words, self.wiki_templates, log_config),
+            skip_unchanged=True, depends_on=self.wiki_templates)
         self.desired_lexemes = ContentStore(
             path / 'expected_lexemes.db',
-            PageToLexemsFilter(log_config, config.wiktionary, self.parsed_wiki_words))
+            PageToLexemsFilter(log_config, config.wiktionary, self.parsed_wiki_words),
+            skip_unchanged=True)
         self.wiktionary_updater = UpdateWiktionaryWithLexemeId(
             log_config, self.wiki_words, self.existing_lexemes, config.wiktionary)
         self.lexeme_creator = WikidataUploader(
             config.wikidata, self.desired_lexemes, self.existing_lexemes, self.wiktionary_updater)
 
+    def import_dump(self, filename: Path, index: Path = None):
+        """
+        Bootstrap raw words and templates from a local pages-articles.xml.bz2 dump instead of the API.
+        With the multistream index, the dump streams are decompressed and parsed in parallel."""
+        reader = MultistreamDumpReader(filename, index) if index else filename
+        try:
+            import_xml_dump(reader, [self.wiki_words, self.wiki_templates])
+        finally:
+            if index:
+                reader.close()
+
+    def import_lexemes_dump(self, filename: Path):
+        """Bootstrap existing lexemes from a local latest-lexemes.json.bz2 dump. Resumes if interrupted."""
+        import_lexeme_dump(LexemeDumpReader(self.existing_lexemes.retriever, filename), self.existing_lexemes)
+
     def delete_pages(self, pages):
         if isinstance(pages, str):
             pages = [pages]
@@ -26,13 +26,18 @@ class PageToLexemsFilter(PageFilter):
 
         self.resolvers: Dict[str, ContentStore] = {
             v.template_name:
-                ContentStore(source.filename.parent / f"resolve_{re.sub(non_letters, '_', v.template_name)}.db", v)
+                ContentStore(source.filename.parent / f"resolve_{re.sub(non_letters, '_', v.template_name)}.db", v,
+                             cache_size=64 * 1024 * 1024)
             for v in retrievers}
 
     def before_refresh(self, filters=None):
         for v in self.resolvers.values():
             v.custom_refresh(filters)
 
+    def after_refresh(self, filters=None):
+        for name, v in self.resolvers.items():
+            print(f"Resolver {name} cache: {v.cache}")
+
     # noinspection PyUnusedLocal
     def process_page(self, page: PageContent, force: Union[bool, str]) -> Union[PageContent, None]:
         if not page.data:
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Tuple, Union, Dict, Set
+
+
+@dataclass
+class Expansion:
+    """Expanded text of a template call, and everything the expansion reported to the TokenizerState"""
+    text: str = None
+    results: List[Tuple[str, Union[str, Dict[str, str]]]] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    dependencies: Set[str] = field(default_factory=set)
+    flags: Set[str] = field(default_factory=set)
+    page_dependent: bool = False
+
+
+class ExpansionCache:
+    """
+    Bounded LRU cache of template expansions shared by all pages, keyed by the template title and arguments.
+    Expansions that used the page name are not cached. Must be cleared when the templates change."""
+
+    def __init__(self, max_size: int = 100000) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        # Templates that produced a page-specific expansion at least once
+        self.page_dependent: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def get(self, key: tuple) -> Union[Expansion, None]:
+        expansion = self.entries.get(key)
+        if expansion is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return expansion
+
+    def put(self, key: tuple, title: str, expansion: Expansion) -> None:
+        if expansion.page_dependent:
+            self.uncacheable += 1
+            self.page_dependent.add(title)
+            return
+        self.entries[key] = expansion
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.page_dependent.clear()
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.1%}" if total else 'n/a'
+        return (f"Template expansions: {self.hits:,} cached and {self.misses:,} expanded ({rate} hit rate), "
+                f"{self.uncacheable:,} depended on the page name ({len(self.page_dependent):,} templates), "
+                f"{len(self.entries):,} of {self.max_size:,} cache entries used")
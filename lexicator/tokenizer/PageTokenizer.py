@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 import dataclasses
+import pickle
 import re
-from typing import Dict, Union
+from typing import Dict, Union, Tuple
+
+from mwparserfromhell import parse as mw_parse
+from mwparserfromhell.wikicode import Wikicode
 
 from lexicator.consts import NS_TEMPLATE_NAME, lower_first_letter, wikipage_must_have, root_templates, \
     double_title_case, ignore_templates, re_template_names, re_ignore_template_prefixes, upper_first_letter, \
     well_known_parameters, re_allowed_extras, re_section_headers, ignore_pages_if_template, MEANING_HEADERS
 from lexicator.wikicache import PageFilter, ContentStore, LogConfig, PageContent
+from .ExpansionCache import ExpansionCache
+from .SectionParser import SectionParser
 from .TokenizerState import TokenizerState
 from .TemplateParser import TemplateParser
 from .common import expand_template, preparser
@@ -24,6 +30,9 @@ class PageTokenizer(PageFilter):
         self.template_ns_lc = lower_first_letter(self.template_ns)
         self.wiki_templates = wiki_templates
         self.templates_no_ns: Dict[str, PageContent] = {}
+        self.expansions = ExpansionCache()
+        # Template title -> (content, pickled parse tree), kept for the life of the process
+        self.parsed_templates: Dict[str, Tuple[str, bytes]] = {}
         self.re_wikipage_must_have = re.compile('|'.join((v for v in wikipage_must_have[lang_code])))
         self.root_templates = root_templates[lang_code]
         self.re_root_templates = re.compile('|'.join(self.root_templates))
@@ -36,6 +45,7 @@ class PageTokenizer(PageFilter):
 
         section_header_regex = re_section_headers[self.lang_code]
         self.re_section_headers = (lambda obj: section_header_regex.search(str(obj))) if section_header_regex else None
+        self.section_parser = SectionParser(self.re_section_headers)
 
         self.re_ignore_template_prefixes = re.compile(
             r'^(' + '|'.join(double_title_case(re_ignore_template_prefixes[lang_code])) + r')')
@@ -50,6 +60,25 @@ class PageTokenizer(PageFilter):
 
         self.preparser = preparser[lang_code] or (lambda v: v)
 
+    def before_refresh(self, filters=None):
+        # Templates may have changed since they were cached
+        self.templates_no_ns.clear()
+        self.expansions.clear()
+
+    def after_refresh(self, filters=None):
+        print(self.expansions)
+        print(self.section_parser)
+
+    def parse_template(self, template: PageContent) -> Wikicode:
+        """Parse tree of the template that the caller may modify. Unpickling a tree parsed earlier
+        is several times faster than parsing the wikitext again."""
+        entry = self.parsed_templates.get(template.title)
+        if entry is not None and entry[0] == template.content:
+            return pickle.loads(entry[1])
+        code = mw_parse(template.content)
+        self.parsed_templates[template.title] = (template.content, pickle.dumps(code, pickle.HIGHEST_PROTOCOL))
+        return code
+
     def process_page(self, page: PageContent, force: Union[bool, str]) -> PageContent:
         if page.content and self.is_valid_page(page):
             state = TokenizerState(self, page, force)
@@ -59,7 +88,8 @@ class PageTokenizer(PageFilter):
                 content = '\n'.join(state.warnings)
             else:
                 content = None
-            return dataclasses.replace(page, data=state.result, content=content)
+            return dataclasses.replace(page, data=state.result, content=content,
+                                       dependencies=sorted(state.templates))
 
     def is_valid_page(self, page: PageContent):
         return self.re_wikipage_must_have.search(page.content) and (
@@ -0,0 +1,143 @@
+import re
+from bisect import bisect_right
+from time import perf_counter
+from typing import Callable, List, Union, Tuple
+
+from mwparserfromhell import parse as mw_parse
+from mwparserfromhell.definitions import is_parsable, is_single
+from mwparserfromhell.nodes import Node, Heading
+from mwparserfromhell.wikicode import Wikicode
+
+# Lines that may be level-1 headings, the parser decides
+re_heading_line = re.compile(r'^=[^\n]*', re.MULTILINE)
+# Markup that may span several lines, and so may hide a heading line from the parser
+re_markup = re.compile(r'\{\{|\}\}|\[\[|\]\]|^[ \t]*\{\||^[ \t]*\|\}|<!--|<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^<>]*?(/?)>',
+                       re.MULTILINE)
+closing_markup = {'}}': '{{', ']]': '[['}
+
+# Upper bounds of the page size buckets in the timing report, in characters
+size_buckets = [4096, 16384, 65536, None]
+
+
+def clean_positions(text: str) -> Tuple[List[int], List[bool]]:
+    """
+    Positions where the open/close markup changes the balance, and whether everything is closed right after them.
+    Unclosed markup, e.g. a stray <span>, makes the rest of the page look unbalanced, which only costs speed."""
+    positions, clean = [], []
+    depth = {}
+    pos = 0
+    lowered = None
+    while True:
+        match = re_markup.search(text, pos)
+        if not match:
+            break
+        pos = match.end()
+        value = match.group(0).strip()
+        if value == '<!--':
+            positions.append(pos)
+            clean.append(False)
+            end = text.find('-->', pos)
+            if end < 0:
+                break
+            pos = end + 3
+        elif match.group(2):
+            name = match.group(2).lower()
+            if match.group(3) or is_single(name):
+                continue
+            if match.group(1):
+                if depth.get(name):
+                    depth[name] -= 1
+            elif not is_parsable(name):
+                # The content of <nowiki>, <pre>, etc. is not wikitext, the closing tag is matched next
+                positions.append(pos)
+                clean.append(False)
+                lowered = lowered or text.lower()
+                end = lowered.find(f'</{name}', pos)
+                if end < 0:
+                    break
+                pos = end
+                continue
+            else:
+                depth[name] = depth.get(name, 0) + 1
+        elif value in closing_markup or value == '|}':
+            key = closing_markup.get(value, '{|')
+            if depth.get(key):
+                depth[key] -= 1
+        else:
+            depth[value] = depth.get(value, 0) + 1
+        positions.append(pos)
+        clean.append(not any(depth.values()))
+    return positions, clean
+
+
+class SectionParser:
+    """
+    Parses only the level-1 sections whose headings match, e.g. the {{-ru-}} section of a page with dozens of
+    languages. The page is split at the level-1 heading lines that are outside of any multi-line markup,
+    and only the parts with a matching heading line are parsed, so the result is the same as parsing the whole
+    page and keeping those sections."""
+
+    def __init__(self, matches: Union[Callable[[Node], bool], None]) -> None:
+        self.matches = matches
+        # Per size bucket: number of pages, their characters, the characters parsed, and the parse time
+        self.pages = [0] * len(size_buckets)
+        self.chars = [0] * len(size_buckets)
+        self.parsed = [0] * len(size_buckets)
+        self.seconds = [0.0] * len(size_buckets)
+
+    def parse(self, text: str) -> Wikicode:
+        start = perf_counter()
+        if self.matches:
+            parts = self.matching_parts(text)
+            code = Wikicode([node for part_start, part_end in parts
+                             for node in mw_parse(text[part_start:part_end]).nodes])
+            parsed = sum(part_end - part_start for part_start, part_end in parts)
+        else:
+            code = mw_parse(text)
+            parsed = len(text)
+        bucket = next(idx for idx, limit in enumerate(size_buckets) if limit is None or len(text) < limit)
+        self.pages[bucket] += 1
+        self.chars[bucket] += len(text)
+        self.parsed[bucket] += parsed
+        self.seconds[bucket] += perf_counter() - start
+        return code
+
+    def matching_parts(self, text: str) -> List[Tuple[int, int]]:
+        """[start, end) ranges of the text that can be parsed on their own and contain all matching sections"""
+        headings = []
+        for match in re_heading_line.finditer(text):
+            nodes = mw_parse(match.group(0)).nodes
+            if nodes and isinstance(nodes[0], Heading) and nodes[0].level == 1:
+                headings.append((match.start(), bool(self.matches(nodes[0].title))))
+        if not any(matches for _, matches in headings):
+            return []
+        positions, clean = clean_positions(text)
+        # Each part starts at a heading line preceded by balanced markup, so it is parsed the same on its own
+        parts = [[0, False]]
+        for pos, matches in headings:
+            idx = bisect_right(positions, pos) - 1
+            if pos > 0 and (idx < 0 or clean[idx]):
+                parts.append([pos, matches])
+            elif matches:
+                parts[-1][1] = True
+        result = []
+        for idx, (part_start, matches) in enumerate(parts):
+            if matches:
+                part_end = parts[idx + 1][0] if idx + 1 < len(parts) else len(text)
+                if result and result[-1][1] == part_start:
+                    result[-1] = (result[-1][0], part_end)
+                else:
+                    result.append((part_start, part_end))
+        return result
+
+    def __str__(self) -> str:
+        lines = []
+        lower = 0
+        for idx, limit in enumerate(size_buckets):
+            if self.pages[idx]:
+                label = f"{lower // 1024}-{limit // 1024}KB" if limit else f"{lower // 1024}KB+"
+                lines.append(f"  {label}: {self.pages[idx]:,} pages, "
+                             f"{self.seconds[idx] / self.pages[idx] * 1000:.2f}ms per page, "
+                             f"{self.parsed[idx] / max(self.chars[idx], 1):.1%} of the text parsed")
+            lower = limit
+        return 'Page parsing by size:\n' + '\n'.join(lines) if lines else 'Page parsing: no pages'
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from html import unescape
-from typing import Union, Iterable
+from typing import Union, Iterable, Dict
 
 from mwparserfromhell import parse as mw_parse
 from mwparserfromhell.nodes import Template, Text, Wikilink, Comment, Heading, Argument, Tag, HTMLEntity, \
@@ -9,8 +9,9 @@ from mwparserfromhell.nodes import Template, Text, Wikilink, Comment, Heading, A
 from mwparserfromhell.nodes.extras import Parameter
 from mwparserfromhell.wikicode import Wikicode
 
+from lexicator.wikicache import PageContent
 from .TokenizerState import TokenizerState
-from .common import ignore_types, custom_templates
+from .common import ignore_types, custom_templates, page_name_templates
 
 
 class TemplateParser:
@@ -21,14 +22,15 @@ class TemplateParser:
         self.arguments = arguments
         self.state = state
 
-    def run(self) -> Wikicode:
+    def run(self, code: Wikicode = None) -> Wikicode:
         # print(f'\n------------------ {self.word}: "{self.template_name}" ----------------------')
-        code = mw_parse(self.content)
+        if code is None:
+            code = mw_parse(self.content)
         self.apply_wikitext(code)
         return code
 
     def parse_page(self):
-        code = mw_parse(self.state.page_parser.preparser(self.content))
+        code = self.state.page_parser.section_parser.parse(self.state.page_parser.preparser(self.content))
         for section in code.get_sections(levels=[1],
                                          matches=self.state.page_parser.re_section_headers,
                                          include_headings=False):
@@ -181,6 +183,7 @@ class TemplateParser:
                     self.repl_conditional(arg, code, key)
                 elif name.startswith('#ifexist:'):
                     key = name[len('#ifexist:'):].strip().replace(self.state.page_parser.template_ns, '').strip()
+                    self.state.add_dependency(key)
                     self.repl_conditional(arg, code, 1 if key in self.state.page_parser.templates_no_ns else 2)
                 else:
                     raise ValueError(f'Unhandled special {name}')
@@ -188,6 +191,8 @@ class TemplateParser:
                 for param in arg.params:
                     self.apply_value(code, param)
                 if name in custom_templates:
+                    if name in page_name_templates:
+                        self.state.uses_page_name()
                     custom_templates[name](self, code, arg)
                 elif ((name in self.state.page_parser.expand_template
                        and not self.state.page_parser.expand_template[name](arg))
@@ -199,10 +204,7 @@ class TemplateParser:
                     if template_page:
                         sub_template_params = params_to_dict(arg.params)
                         self.state.add_result('_' + name, sub_template_params)
-                        new_text = TemplateParser(
-                            f'{self.template_name}.{name}', self.word, template_page.content,
-                            sub_template_params, self.state).run()
-                        new_arg = mw_parse(str(new_text).strip())
+                        new_arg = mw_parse(self.expand(name, template_page, sub_template_params))
                         code.replace(arg, new_arg)
                         return new_arg
                     else:
@@ -229,6 +231,27 @@ class TemplateParser:
         else:
             raise ValueError(f'Unknown type {typ} in {arg}')
 
+    def expand(self, name: str, template_page: PageContent, params: Dict[str, str]) -> str:
+        """Expanded text of the template, reusing the expansions of the same call on the other pages"""
+        cache = self.state.page_parser.expansions
+        if self.state.force:
+            return self.expand_template(name, template_page, params)
+        key = (template_page.title, tuple(sorted(params.items())))
+        expansion = cache.get(key)
+        if expansion is None:
+            with self.state.record() as expansion:
+                expansion.text = self.expand_template(name, template_page, params)
+            cache.put(key, template_page.title, expansion)
+        else:
+            self.state.replay(expansion)
+        return expansion.text
+
+    def expand_template(self, name: str, template_page: PageContent, params: Dict[str, str]) -> str:
+        code = self.state.page_parser.parse_template(template_page)
+        new_text = TemplateParser(
+            f'{self.template_name}.{name}', self.word, template_page.content, params, self.state).run(code)
+        return str(new_text).strip()
+
     def repl_conditional(self, arg: Template, code: Wikicode, index: Union[str, int]):
         if arg.has(index):
             param = arg.get(index)
@@ -238,7 +261,7 @@ class TemplateParser:
             code.remove(arg)
 
     def warn(self, message: str):
-        self.state.warnings.append(message)
+        self.state.warn(message)
 
 
 def params_to_dict(params: Iterable[Parameter]):
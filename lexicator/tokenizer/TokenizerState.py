@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import re
+from contextlib import contextmanager
 from dataclasses import dataclass
 from html import unescape
 from typing import List, TYPE_CHECKING, Dict, Tuple, Union, Set
 
 from lexicator.wikicache import PageContent
+from .ExpansionCache import Expansion
 
 if TYPE_CHECKING:
     from .PageTokenizer import PageTokenizer
@@ -24,17 +26,74 @@ class TokenizerState:
         self.warnings: List[str] = []
         self.result: List[Tuple[List[str], str, Union[str, Dict[str, str]]]] = []
         self.header: List[Union[str, dict]] = []
+        # Titles of all templates the page needed, including the missing ones, as they are in wiki_templates
+        self.templates: Set[str] = set()
+        # Expansions being recorded for the ExpansionCache, innermost last
+        self.recorders: List[Expansion] = []
+
+    @contextmanager
+    def record(self) -> Expansion:
+        """Collect everything reported while expanding a template, to replay it on the other pages"""
+        expansion = Expansion()
+        self.recorders.append(expansion)
+        try:
+            yield expansion
+        finally:
+            self.recorders.pop()
+
+    def replay(self, expansion: Expansion):
+        for name, params in expansion.results:
+            self.add_result(name, params)
+        for message in expansion.warnings:
+            self.warn(message)
+        for flag in expansion.flags:
+            self.add_flag(flag)
+        for title in expansion.dependencies:
+            self._add_dependency(title)
+
+    def uses_page_name(self):
+        for recorder in self.recorders:
+            recorder.page_dependent = True
+
+    def warn(self, message: str):
+        self.warnings.append(message)
+        for recorder in self.recorders:
+            recorder.warnings.append(message)
+
+    def add_flag(self, flag: str):
+        self.flags.add(flag)
+        for recorder in self.recorders:
+            recorder.flags.add(flag)
+
+    def add_dependency(self, name: str):
+        self._add_dependency(self.page_parser.template_ns + re_title_space_normalizer.sub(' ', name))
+
+    def _add_dependency(self, title: str):
+        self.templates.add(title)
+        for recorder in self.recorders:
+            recorder.dependencies.add(title)
 
     def get_template(self, name: str):
+        self.add_dependency(name)
+        page = self._get_template(name)
+        if page:
+            # A redirect alias also depends on the template it resolves to
+            self._add_dependency(page.title)
+        return page
+
+    def _get_template(self, name: str):
         templates_no_ns = self.page_parser.templates_no_ns
         if not templates_no_ns:
             templates_no_ns.update(
                 {v.title.split(':', 1)[1]: v for v in self.page_parser.wiki_templates.get_all() if ':' in v.title})
-        if not self.force and name in templates_no_ns:
-            return templates_no_ns[name]
+        # Redirects are kept for #ifexist, get_multiple() replaces them with their targets on the first use
+        page = templates_no_ns.get(name)
+        if not self.force and page and not page.redirect:
+            return page
         name = re_title_space_normalizer.sub(' ', name)
-        if not self.force and name in templates_no_ns:
-            return templates_no_ns[name]
+        page = templates_no_ns.get(name)
+        if not self.force and name in templates_no_ns and not (page and page.redirect):
+            return page
         page = None
         for page in self.page_parser.wiki_templates.get_multiple([self.page_parser.template_ns + name],
                                                                  force=self.force):
@@ -43,6 +102,8 @@ class TokenizerState:
         return page
 
     def add_result(self, name: str, params: Union[Dict[str, str], str]):
+        for recorder in self.recorders:
+            recorder.results.append((name, params))
         if isinstance(params, dict):
             params = {k: unescape(v) for k, v in params.items()}
         self.result.append((self.header[:], name, params,))
@@ -22,7 +22,7 @@ def flag_template(self: TemplateParser, code: Wikicode, template: Template, flag
         code.replace(template, param)
     else:
         code.remove(template)
-    self.state.flags.add(flag)
+    self.state.add_flag(flag)
 
 
 custom_templates = {
@@ -35,6 +35,9 @@ custom_templates = {
     'Str crop': lambda s, c, t: c.replace(t, str(t.params[0]).strip()[:-int(str(t.params[1]).strip())]),
 }
 
+# Custom templates whose output depends on the page being parsed
+page_name_templates = {'PAGENAME'}
+
 # TODO
 custom_templates2 = dict(
     ru={
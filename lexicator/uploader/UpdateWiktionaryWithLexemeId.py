@@ -34,14 +34,16 @@ class UpdateWiktionaryWithLexemeId:
     def run(self):
         self.wiki_words.refresh()
         self.existing_lexemes.refresh()
-        for word, lexemes in list_to_dict_of_lists(self.existing_lexemes.get_all(), lambda l: l.data).items():
+        for word, lexemes in list_to_dict_of_lists(
+                self.existing_lexemes.iter_rows(['title', 'data']), lambda l: l.data).items():
             self.run_one_word(word, lexemes)
 
     def run_one_word(self, word, lexemes=None):
         if word in ignore_words:
             return
         if lexemes is None:
-            lexemes = self.existing_lexemes.get_all(
+            lexemes = self.existing_lexemes.iter_rows(
+                ['title'],
                 filters=self.existing_lexemes.PageContentDb.data == to_json(word),
             )
         lex_ids = [lex.title[len('Lexeme:'):] for lex in lexemes]
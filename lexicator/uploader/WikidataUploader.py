@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 import traceback
 from typing import Set
 
@@ -34,13 +33,11 @@ class WikidataUploader:
     @property
     def existing(self) -> Set[str]:
         if self.__existing is None:
-            self.__existing = {json.loads(p[0]) for p in self.existing_lexemes.get_all(
+            self.__existing = {p.data for p in self.existing_lexemes.iter_rows(
+                ['data'],
                 filters=[
                     self.existing_lexemes.PageContentDb.redirect.is_(None),
                     self.existing_lexemes.PageContentDb.content.isnot(None),
-                ],
-                columns=[
-                    self.existing_lexemes.PageContentDb.data,
                 ])}
         return self.__existing
 
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from itertools import islice
+from threading import Lock
+from typing import Iterable, List, TypeVar, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .utils import MwSite
+
+T = TypeVar('T')
+
+
+class BatchController:
+    """
+    Adapts the number of items sent in one API request to the observed responses.
+    The batch grows while full batches come back fast and small, and is halved on slow or large responses,
+    on errors, and on maxlag. All requests of the same kind to a site share one controller,
+    see MwSite.batch_controller()."""
+
+    def __init__(self, site: MwSite, name: str, size: int, minimum: int, maximum: int,
+                 target_seconds: float = 5.0, max_payload: int = 8 * 1024 * 1024) -> None:
+        self.site = site
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(maximum, size))
+        self.target_seconds = target_seconds
+        self.max_payload = max_payload
+        self.lock = Lock()
+        self.requests = 0
+        self.errors = 0
+        self.grown = 0
+        self.shrunk = 0
+        self.seconds = 0.0
+        self.payload = 0
+
+    def batches(self, items: Iterable[T]) -> Iterable[List[T]]:
+        """Like utils.batches(), but each batch is taken with the batch size current at that moment"""
+        items = iter(items)
+        cassette = self.site.cassette
+        while True:
+            size = cassette.batch_size(f'{self.site.url} {self.name}', self.size) if cassette else self.size
+            batch = list(islice(items, size))
+            if not batch:
+                break
+            yield batch
+
+    @contextmanager
+    def measure(self, count: int):
+        """Observe all API requests made by the current thread inside this block as one request of count items"""
+        payload, lagged = self.site.thread_counters()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.observe(count, time.monotonic() - start, 0, failed=True)
+            raise
+        new_payload, new_lagged = self.site.thread_counters()
+        self.observe(count, time.monotonic() - start, new_payload - payload, failed=new_lagged > lagged)
+
+    def observe(self, count: int, seconds: float, payload: int, failed: bool = False) -> None:
+        with self.lock:
+            self.requests += 1
+            self.seconds += seconds
+            self.payload += payload
+            if failed:
+                self.errors += 1
+            if failed or seconds > self.target_seconds or payload > self.max_payload:
+                self._resize(self.size // 2)
+            elif count >= self.size and seconds < self.target_seconds / 2 and payload < self.max_payload / 2:
+                self._resize(self.size + max(1, self.size // 10))
+
+    def limit(self, size: int) -> None:
+        """Make sure the batch is no bigger than size, e.g. when the server silently dropped some results"""
+        with self.lock:
+            if size < self.size:
+                self._resize(size)
+
+    def _resize(self, size: int) -> None:
+        size = max(self.minimum, min(self.maximum, size))
+        if size > self.size:
+            self.grown += 1
+        elif size < self.size:
+            self.shrunk += 1
+            print(f"Reduced {self.name} batch size on {self.site.url} to {size}")
+        self.size = size
+
+    def stats(self) -> Dict[str, float]:
+        return dict(size=self.size, minimum=self.minimum, maximum=self.maximum, requests=self.requests,
+                    errors=self.errors, grown=self.grown, shrunk=self.shrunk, seconds=self.seconds,
+                    payload=self.payload)
+
+    def __str__(self) -> str:
+        avg = f"{self.seconds / self.requests:.2f}s and {self.payload // self.requests:,} bytes" \
+            if self.requests else 'n/a'
+        return (f"{self.name}: batch size {self.size} ({self.minimum}..{self.maximum}), {self.requests:,} requests, "
+                f"{self.errors:,} errors, grown {self.grown:,} and shrunk {self.shrunk:,} times, average {avg}")
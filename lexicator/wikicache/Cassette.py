@@ -0,0 +1,144 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from threading import Lock
+from typing import Union, Tuple, Dict
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Request parameters that change between runs, or must not end up in the cassette key
+volatile_params = {'token', 'lgtoken', 'lgpassword', 'assert', 'maxlag'}
+
+
+class Cassette:
+    """
+    A local store of HTTP request -> response pairs, to run the downloaders, resolvers and uploaders offline.
+    In the "record" mode requests go to the server and the responses are saved, replacing the earlier recording.
+    In the "replay" mode responses come from the store, optionally delayed to simulate the network.
+    Requests are matched by method, url and parameters, ignoring tokens and passwords. A request sent
+    several times, e.g. retried after maxlag, gets its recorded responses in the same order.
+    The batch sizes picked by the sites' BatchControllers are recorded too, and replayed instead of adapting
+    them to the (simulated) response times, so that the replayed requests are the same as the recorded ones.
+    Only the hash of the request is stored, and the response body is zlib-compressed.
+    Replaying a request more times than it was recorded raises KeyError."""
+
+    def __init__(self, filename: Path, mode: str = 'replay', latency: float = 0.0) -> None:
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown cassette mode {mode}, expected "record" or "replay"')
+        self.filename = filename
+        self.mode = mode
+        self.latency = latency
+        self.lock = Lock()
+        self.db = sqlite3.connect(str(filename), check_same_thread=False)
+        if mode == 'record':
+            self.db.execute('DROP TABLE IF EXISTS responses')
+            self.db.execute('DROP TABLE IF EXISTS batch_sizes')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT, seq INTEGER, url TEXT, status INTEGER, '
+                        'reason TEXT, headers TEXT, body BLOB, PRIMARY KEY (key, seq))')
+        self.db.execute('CREATE TABLE IF NOT EXISTS batch_sizes '
+                        '(name TEXT, seq INTEGER, size INTEGER, PRIMARY KEY (name, seq))')
+        self.db.commit()
+        # How many times each request key, or each batch controller, has been seen so far
+        self.sequences: Dict[str, int] = defaultdict(int)
+        self.recorded = 0
+        self.replayed = 0
+
+    @staticmethod
+    def key(request: requests.PreparedRequest) -> str:
+        url = urlsplit(request.url)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        body = request.body
+        if body:
+            if isinstance(body, bytes):
+                body = body.decode('utf-8')
+            params += parse_qsl(body, keep_blank_values=True)
+        params = sorted((k, v) for k, v in params if k not in volatile_params)
+        value = json.dumps([request.method, url.netloc, url.path, params], ensure_ascii=False)
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def adapter(self, **kwargs) -> 'CassetteAdapter':
+        return CassetteAdapter(self, **kwargs)
+
+    def session(self, **kwargs) -> requests.Session:
+        """A new session that sends all http and https requests through this cassette"""
+        session = requests.Session()
+        adapter = self.adapter(**kwargs)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, key: str) -> Union[Tuple[str, int, str, str, bytes], None]:
+        """The next recorded response to the request, or None if all of them have been replayed"""
+        with self.lock:
+            seq = self.sequences[key]
+            self.sequences[key] += 1
+            return self.db.execute('SELECT url, status, reason, headers, body FROM responses '
+                                   'WHERE key = ? AND seq = ?', (key, seq)).fetchone()
+
+    def put(self, key: str, response: requests.Response) -> None:
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() not in ('set-cookie', 'content-encoding', 'content-length', 'transfer-encoding')}
+        with self.lock:
+            seq = self.sequences[key]
+            self.sequences[key] += 1
+            self.db.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (key, seq, response.url, response.status_code, response.reason,
+                             json.dumps(headers), zlib.compress(response.content)))
+            self.db.commit()
+            self.recorded += 1
+
+    def batch_size(self, name: str, size: int) -> int:
+        """Record the size of the next batch of the named controller, or replay the recorded one"""
+        with self.lock:
+            seq = self.sequences[f'batch {name}']
+            self.sequences[f'batch {name}'] += 1
+            if self.mode == 'record':
+                self.db.execute('INSERT INTO batch_sizes VALUES (?, ?, ?)', (name, seq, size))
+                self.db.commit()
+                return size
+            row = self.db.execute('SELECT size FROM batch_sizes WHERE name = ? AND seq = ?', (name, seq)).fetchone()
+            # Past the end of the recording, the requests will not be found anyway
+            return row[0] if row else size
+
+    def __str__(self) -> str:
+        return f"Cassette {self.filename} ({self.mode}): {self.recorded:,} recorded, {self.replayed:,} replayed"
+
+
+class CassetteAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        key = self.cassette.key(request)
+        if self.cassette.mode == 'record':
+            response = super().send(request, **kwargs)
+            self.cassette.put(key, response)
+            return response
+
+        entry = self.cassette.get(key)
+        if not entry:
+            raise KeyError(f'{request.method} {request.url} is not in {self.cassette.filename}, '
+                           f'or was recorded fewer times')
+        if self.cassette.latency:
+            time.sleep(self.cassette.latency)
+        url, status, reason, headers, body = entry
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response._content = zlib.decompress(body)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        response.request = request
+        response.connection = self
+        with self.cassette.lock:
+            self.cassette.replayed += 1
+        return response
@@ -0,0 +1,53 @@
+from threading import Lock
+from typing import Dict, Iterable, List, Union
+
+
+class ContentCompressor:
+    """
+    Transparent zstd compression of the large text columns of a ContentStore.
+    Each column uses its own dictionary trained on a sample of the store, because most pages
+    repeat the same template boilerplate. Compressed values are stored as blobs and uncompressed
+    ones as text, so a store can be migrated gradually. Every zstd frame records the id
+    of its dictionary, so values compressed with an older dictionary remain readable after retraining."""
+
+    def __init__(self, columns: Iterable[str], level: int = 9) -> None:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Content compression requires the "zstandard" package')
+        self.zstd = zstandard
+        self.columns = set(columns)
+        self.level = level
+        self.lock = Lock()
+        # column name -> compressor using the most recent dictionary for that column
+        self.compressors: Dict[str, zstandard.ZstdCompressor] = {}
+        # dictionary id -> decompressor
+        self.decompressors: Dict[int, zstandard.ZstdDecompressor] = {}
+
+    def add_dictionary(self, column: str, dictionary: bytes) -> int:
+        """Register a dictionary. The last one added for a column is used to compress it."""
+        zstd_dict = self.zstd.ZstdCompressionDict(dictionary)
+        dict_id = zstd_dict.dict_id()
+        with self.lock:
+            self.compressors[column] = self.zstd.ZstdCompressor(level=self.level, dict_data=zstd_dict)
+            self.decompressors[dict_id] = self.zstd.ZstdDecompressor(dict_data=zstd_dict)
+        return dict_id
+
+    def train(self, samples: List[str], dict_size: int = 256 * 1024) -> bytes:
+        return self.zstd.train_dictionary(dict_size, [v.encode('utf-8') for v in samples]).as_bytes()
+
+    def compress(self, column: str, value: Union[str, None]) -> Union[str, bytes, None]:
+        if value is None or column not in self.compressors:
+            return value
+        with self.lock:
+            return self.compressors[column].compress(value.encode('utf-8'))
+
+    def decompress(self, value: Union[str, bytes, None]) -> Union[str, None]:
+        if not isinstance(value, bytes):
+            return value
+        dict_id = self.zstd.get_frame_parameters(value).dict_id
+        with self.lock:
+            decompressor = self.decompressors.get(dict_id)
+            if not decompressor:
+                raise ValueError(f'Compression dictionary {dict_id} is not known')
+            return decompressor.decompress(value).decode('utf-8')
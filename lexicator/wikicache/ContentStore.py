@@ -1,31 +1,135 @@
+import hashlib
+import heapq
 import json
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterable, Callable, Set, Union, TypeVar
+from threading import Lock
+from typing import Iterable, Callable, Set, Union, TypeVar, Dict, Tuple, List
 
 from pywikiapi import to_timestamp
-from sqlalchemy import Column, Integer, Unicode, UnicodeText, DateTime
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, Unicode, Text, DateTime, LargeBinary
+from sqlalchemy import create_engine, text, bindparam, event, MetaData, select, or_, and_, exists, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session, deferred, undefer_group
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.visitors import replacement_traverse
 
+from .ContentCompressor import ContentCompressor
+from .PageCache import PageCache
 from .PageContent import PageContent
 from .PageRetriever import PageRetriever
-from .utils import batches, trim_timedelta, to_compact_json
+from .PageRow import PageRow
+from .utils import batches, trim_timedelta, to_compact_json, outer_join_sorted, prefetch, unique_sorted
 
 T = TypeVar('T')
 
+load_payload = undefer_group('payload')
+
+# Prefix of the info continuation value of an interrupted full reload, followed by the title to resume from
+refresh_continuation = 'refresh:'
+
+# Named sets of sqlite pragmas applied to the connections of a store, except for writer_only_pragmas.
+# "safe" keeps full durability, "bulk-load" is for caches that can be re-downloaded
+# if the machine crashes mid-write, and trades durability for write speed.
+pragma_profiles: Dict[str, Dict[str, Union[str, int]]] = {
+    'safe': dict(
+        journal_mode='WAL',
+        synchronous='FULL',
+    ),
+    'bulk-load': dict(
+        journal_mode='WAL',
+        synchronous='OFF',
+        cache_size=-512 * 1024,  # negative value is in KiB
+        mmap_size=4 * 1024 ** 3,
+        temp_store='MEMORY',
+    ),
+}
+
+
+# Not applied to the read pool: journal mode is persisted in the db file and is set by the writer,
+# and a large page cache per reader connection would multiply the memory use by the pool size
+writer_only_pragmas = {'journal_mode', 'cache_size'}
+
+
+# Refresh progress is counted both by the prefetch producer thread and by the thread saving the pages
+progress_lock = Lock()
+
+
+def count_progress(progress: Dict[str, int], key: str, count: int = 1) -> None:
+    with progress_lock:
+        progress[key] += count
+
+
+def quote(name: str) -> str:
+    return f'"{name}"'
+
+
+# Columns that contribute to the row hash. Title is the key, and revid is compared separately.
+hashed_columns = ['timestamp', 'ns', 'user', 'redirect', 'data', 'content']
+
+
+def row_hash(row: dict) -> str:
+    values = [row[c].isoformat() if c == 'timestamp' and row[c] else row[c] for c in hashed_columns]
+    return hashlib.sha1(to_compact_json(values).encode('utf-8')).hexdigest()
+
+
+def page_to_row(content: PageContent) -> dict:
+    row = dict(
+        title=content.title,
+        timestamp=content.timestamp,
+        ns=content.ns,
+        revid=content.revid,
+        user=content.user,
+        redirect=content.redirect,
+        data=to_compact_json(content.data) if content.data is not None else None,
+        content=content.content,
+    )
+    row['hash'] = row_hash(row)
+    return row
+
 
 class ContentStore:
-    def __init__(self, filename: Path, retriever: PageRetriever):
+    def __init__(self, filename: Path, retriever: PageRetriever, batch_size: int = 200, bulk_save: bool = True,
+                 skip_unchanged: bool = False, pragmas: str = 'safe', read_pool_size: int = 4,
+                 cache_size: int = 0, compress: Iterable[str] = None, check_revisions: bool = False,
+                 pipeline: int = 0, depends_on: 'ContentStore' = None):
         self.filename: Path = filename
         self.retriever: PageRetriever = retriever
         self.retriever_initialized: bool = False
+        # Number of pages written per transaction, and whether to use a single
+        # INSERT ... ON CONFLICT executemany() per batch instead of the ORM
+        self.batch_size = batch_size
+        self.bulk_save = bulk_save
+        # Do not rewrite rows whose hash and revid are the same as the stored ones
+        self.skip_unchanged = skip_unchanged
+        # Optional LRU cache of the pages read from this store, limited to cache_size bytes
+        self.cache: Union[PageCache, None] = PageCache(cache_size) if cache_size else None
+        # Columns (content and/or data) stored zstd-compressed once a dictionary has been trained,
+        # see migrate_compression(). Compressed columns cannot be compared to values in filters.
+        self.compressor = ContentCompressor(compress) if compress else None
+        # On incremental refresh, ask the retriever for the current revision ids first,
+        # and only download the pages whose stored revision is out of date
+        self.check_revisions = check_revisions
+        # If set, refresh() downloads in a background thread while saving, with up to this many batches queued
+        self.pipeline = pipeline
+        # Pages here may also be generated from the pages of depends_on, e.g. the templates expanded by the tokenizer.
+        # When those change, the dependent pages are marked as stale, and regenerated on the next refresh.
+        self.depends_on = depends_on
+        self.dependents: List[ContentStore] = []
+        if depends_on:
+            depends_on.dependents.append(self)
+
+        if pragmas not in pragma_profiles:
+            raise ValueError(f"Unknown pragma profile {pragmas}, expected one of {', '.join(pragma_profiles)}")
+        self.pragmas = pragma_profiles[pragmas]
 
         self.engine = create_engine(f'sqlite:///{filename}',
                                     # echo=True
                                     )
+        event.listen(self.engine, 'connect', lambda con, _: self.init_connection(con, read_only=False))
         self.Base = declarative_base(bind=self.engine)
+        store = self
 
         class PageContentDb(self.Base):
             __tablename__ = 'pages'
@@ -36,20 +140,14 @@ class ContentStore:
             revid = Column(Integer, nullable=True)
             user = Column(Unicode(256), nullable=True)
             redirect = Column(Unicode(256), nullable=True)
-            data = Column(UnicodeText, nullable=True)
-            content = Column(UnicodeText, nullable=True)
-
-            def __init__(self, content: PageContent) -> None:
-                super().__init__(
-                    title=content.title,
-                    timestamp=content.timestamp,
-                    ns=content.ns,
-                    revid=content.revid,
-                    user=content.user,
-                    redirect=content.redirect,
-                    data=to_compact_json(content.data) if content.data is not None else None,
-                    content=content.content,
-                )
+            # Large columns are only loaded by the queries that need them, see load_payload.
+            # Text rather than UnicodeText because compressed values are stored as blobs.
+            data = deferred(Column(Text, nullable=True), group='payload')
+            content = deferred(Column(Text, nullable=True), group='payload')
+            hash = Column(Unicode(40), nullable=True)
+
+            def __init__(self, row: dict) -> None:
+                super().__init__(**row)
 
             def to_content(self):
                 return PageContent(
@@ -59,20 +157,101 @@ class ContentStore:
                     revid=self.revid,
                     user=self.user,
                     redirect=self.redirect,
-                    data=None if self.data is None else json.loads(self.data),
-                    content=self.content,
+                    data=None if self.data is None else json.loads(store.decompress(self.data)),
+                    content=store.decompress(self.content),
                 )
 
         class InfoDb(self.Base):
             __tablename__ = 'info'
             info_id = Column(Integer, primary_key=True, autoincrement=True)
             timestamp = Column(DateTime)
+            # Where an interrupted bulk load should resume from
+            continuation = Column(Unicode)
+
+        class DependencyDb(self.Base):
+            __tablename__ = 'dependencies'
+            title = Column(Unicode(256), primary_key=True)
+            dependency = Column(Unicode(256), primary_key=True, index=True)
+
+        class StaleDb(self.Base):
+            __tablename__ = 'stale'
+            title = Column(Unicode(256), primary_key=True)
+
+        class DictionaryDb(self.Base):
+            __tablename__ = 'dictionaries'
+            dict_id = Column(Integer, primary_key=True, autoincrement=False)
+            column = Column(Unicode(32))
+            timestamp = Column(DateTime)
+            dictionary = Column(LargeBinary)
 
         self.Base.metadata.create_all()
+        self.add_missing_columns(PageContentDb.__table__)
+        self.add_missing_columns(InfoDb.__table__)
         self.db = sessionmaker(bind=self.engine)()
+
+        # Readers use their own connections so that lookups do not wait for the writer's transaction.
+        # With WAL, readers see the last committed state, and autocommit sessions do not hold a snapshot open.
+        self.read_engine = create_engine(f'sqlite:///{filename}',
+                                         poolclass=QueuePool,
+                                         pool_size=read_pool_size,
+                                         connect_args=dict(check_same_thread=False))
+        event.listen(self.read_engine, 'connect', lambda con, _: self.init_connection(con, read_only=True))
+        self.Reader = sessionmaker(bind=self.read_engine, autocommit=True)
         self.PageContentDb = PageContentDb
         self.InfoDb = InfoDb
+        self.DictionaryDb = DictionaryDb
+        self.DependencyDb = DependencyDb
+        self.StaleDb = StaleDb
+        if self.compressor:
+            for v in self.db.query(DictionaryDb).order_by(DictionaryDb.timestamp):
+                self.compressor.add_dictionary(v.column, v.dictionary)
         self.retriever_source: ContentStore = self.retriever.source
+        # Reader connections of a derived store attach the source store's db as the "source" schema,
+        # so that finding the pages to refresh is a join on the title indexes rather than a Python loop
+        self.source_pages = None
+        if self.retriever_source:
+            self.source_pages = PageContentDb.__table__.tometadata(MetaData(), schema='source')
+
+        columns = [c.name for c in PageContentDb.__table__.columns]
+        self.upsert_statement = text(
+            f"INSERT INTO pages ({', '.join(quote(c) for c in columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)}) "
+            f"ON CONFLICT(title) DO UPDATE SET "
+            f"{', '.join(f'{quote(c)} = excluded.{quote(c)}' for c in columns if c != 'title')}"
+        ).bindparams(bindparam('timestamp', type_=DateTime))
+        self.upsert_changed_statement = text(
+            f"{self.upsert_statement.text} "
+            f"WHERE pages.hash IS NOT excluded.hash OR pages.revid IS NOT excluded.revid"
+        ).bindparams(bindparam('timestamp', type_=DateTime))
+
+    def init_connection(self, connection, read_only: bool) -> None:
+        cursor = connection.cursor()
+        for pragma, value in self.pragmas.items():
+            if read_only and pragma in writer_only_pragmas:
+                continue
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        if read_only:
+            if self.retriever.source:
+                cursor.execute('ATTACH DATABASE ? AS source', (str(self.retriever.source.filename),))
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    @contextmanager
+    def read_session(self) -> Iterable[Session]:
+        session = self.Reader()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def add_missing_columns(self, table):
+        """create_all() does not alter existing tables, so add any columns introduced after the db was created"""
+        existing = {row[1] for row in self.engine.execute(f'PRAGMA table_info({table.name})')}
+        for column in table.columns:
+            if column.name not in existing:
+                print(f"Adding column {column.name} to {table.name} in {self.filename}")
+                col_type = column.type.compile(dialect=self.engine.dialect)
+                self.engine.execute(f'ALTER TABLE {table.name} ADD COLUMN {quote(column.name)} {col_type}')
 
     def init_retriever(self):
         if not self.retriever_initialized:
@@ -101,12 +280,12 @@ class ContentStore:
                 while len(keys_to_try) > 0:
                     redirect_keys = set()
                     keys_tried.update(keys_to_try)
-                    for raw_page in self.db.query(self.PageContentDb).filter(self.PageContentDb.title.in_(keys_to_try)):
-                        keys_to_try.remove(raw_page.title)
-                        if not raw_page.redirect or not self.retriever.follow_redirects:
-                            yield raw_page.to_content()
+                    for page in self._read_pages(keys_to_try):
+                        keys_to_try.remove(page.title)
+                        if not page.redirect or not self.retriever.follow_redirects:
+                            yield page
                         else:
-                            redirect_keys.add(raw_page.redirect)
+                            redirect_keys.add(page.redirect)
                     not_found.update(keys_to_try)
                     keys_to_try = redirect_keys - keys_tried
                 for key in redirect_keys:
@@ -122,45 +301,138 @@ class ContentStore:
                 if not v.redirect or not self.retriever.follow_redirects
             )
 
+    def _read_pages(self, keys: Set[str]) -> List[PageContent]:
+        found = []
+        if self.cache:
+            for key in keys:
+                page = self.cache.get(key)
+                if page:
+                    found.append(page)
+            if found:
+                keys = keys - {v.title for v in found}
+        if keys:
+            with self.read_session() as reader:
+                for row in reader.query(self.PageContentDb).options(load_payload) \
+                        .filter(self.PageContentDb.title.in_(keys)):
+                    page = row.to_content()
+                    if self.cache:
+                        self.cache.put(page)
+                    found.append(page)
+        return found
+
     def read_object(self, key: str) -> PageContent:
-        return self.get_raw_object(key).to_content()
+        with self.read_session() as reader:
+            return self.get_raw_object(key, reader).to_content()
 
-    def get_raw_object(self, key: str):
-        for page in self.db.query(self.PageContentDb).filter(self.PageContentDb.title == key):
+    def get_raw_object(self, key: str, session: Session = None):
+        query = (session or self.db).query(self.PageContentDb).options(load_payload)
+        for page in query.filter(self.PageContentDb.title == key):
             return page
         raise KeyError(key)
 
-    def save_pages(self, pages: Iterable[PageContent]) -> Iterable[PageContent]:
+    def save_pages(self, pages: Iterable[PageContent], progress: Dict[str, int] = None) -> Iterable[PageContent]:
         result = []
         delete = []
-        for batch in batches(pages, 200):
+        unchanged = 0
+        for batch in batches(pages, self.batch_size):
             new_pages = {}
             for v in batch:
                 if v.is_deleted():
                     delete.append(v.title)
                 else:
                     new_pages[v.title] = v
-            for page in self.db.query(self.PageContentDb).filter(self.PageContentDb.title.in_(new_pages.keys())):
-                new_page = new_pages.pop(page.title)
-                page.title = new_page.title
-                page.timestamp = new_page.timestamp
-                page.ns = new_page.ns
-                page.revid = new_page.revid
-                page.user = new_page.user
-                page.redirect = new_page.redirect
-                page.data = to_compact_json(new_page.data) if new_page.data is not None else None
-                page.content = new_page.content
-                result.append(new_page)
-            for new_page in new_pages.values():
-                self.db.add(self.PageContentDb(new_page))
-                result.append(new_page)
-            self.db.commit()
+            if self.cache:
+                self.cache.invalidate(new_pages.keys())
+            if self.bulk_save:
+                unchanged += self._upsert_batch(new_pages)
+            else:
+                unchanged += self._save_batch_orm(new_pages)
+            if self.depends_on:
+                self._save_dependencies(batch)
+            result.extend(new_pages.values())
         self.delete_pages(delete)
+        if progress is not None:
+            count_progress(progress, 'unchanged', unchanged)
         return result
 
+    def to_row(self, page: PageContent) -> dict:
+        row = page_to_row(page)
+        if self.compressor:
+            for column in self.compressor.columns:
+                row[column] = self.compressor.compress(column, row[column])
+        return row
+
+    def decompress(self, value):
+        return self.compressor.decompress(value) if self.compressor else value
+
+    def _upsert_batch(self, new_pages: Dict[str, PageContent]) -> int:
+        """Returns the number of rows that were left as is because they have not changed"""
+        if not new_pages:
+            return 0
+        statement = self.upsert_changed_statement if self.skip_unchanged else self.upsert_statement
+        res = self.db.execute(statement, [self.to_row(v) for v in new_pages.values()])
+        self.db.commit()
+        return len(new_pages) - res.rowcount if self.skip_unchanged else 0
+
+    def _save_batch_orm(self, new_pages: Dict[str, PageContent]) -> int:
+        new_pages = dict(new_pages)
+        unchanged = 0
+        for page in self.db.query(self.PageContentDb).filter(self.PageContentDb.title.in_(new_pages.keys())):
+            row = self.to_row(new_pages.pop(page.title))
+            if self.skip_unchanged and page.hash == row['hash'] and page.revid == row['revid']:
+                unchanged += 1
+                continue
+            for key, value in row.items():
+                setattr(page, key, value)
+        for new_page in new_pages.values():
+            self.db.add(self.PageContentDb(self.to_row(new_page)))
+        self.db.commit()
+        return unchanged
+
+    def _save_dependencies(self, pages: List[PageContent]) -> None:
+        """Replace the dependencies of the pages that know them, and clear their stale marks"""
+        known = [v for v in pages if v.dependencies is not None or v.is_deleted()]
+        if not known:
+            return
+        titles = [v.title for v in known]
+        self.db.execute(self.DependencyDb.__table__.delete().where(self.DependencyDb.title.in_(titles)))
+        self.db.execute(self.StaleDb.__table__.delete().where(self.StaleDb.title.in_(titles)))
+        rows = [dict(title=v.title, dependency=d) for v in known for d in set(v.dependencies or [])]
+        if rows:
+            self.db.execute(self.DependencyDb.__table__.insert(), rows)
+        self.db.commit()
+
+    def mark_stale(self, dependencies: Iterable[str]) -> int:
+        """Mark the pages that depend on any of the given titles of the depends_on store for regeneration"""
+        deps, stale = self.DependencyDb.__table__, self.StaleDb.__table__
+        count = 0
+        for batch in batches(dependencies, 500):
+            query = select([deps.c.title]).where(deps.c.dependency.in_(batch)).distinct()
+            count += self.db.execute(stale.insert().prefix_with('OR IGNORE').from_select(['title'], query)).rowcount
+            self.db.commit()
+        if count:
+            print(f"Marked {count:,} pages in {self.filename} as stale")
+        return count
+
+    def find_marked_titles(self) -> List[str]:
+        """Titles marked as stale that still exist in the source store, ordered by title"""
+        stale, src = self.StaleDb.__table__, self.source_pages.alias('src')
+        query = select([stale.c.title]).where(exists().where(src.c.title == stale.c.title)).order_by(stale.c.title)
+        with self.read_session() as reader:
+            return [row[0] for row in reader.execute(query)]
+
+    def clear_marks(self, titles: Iterable[str]) -> None:
+        for batch in batches(titles, 500):
+            self.db.execute(self.StaleDb.__table__.delete().where(self.StaleDb.title.in_(batch)))
+            self.db.commit()
+
     def delete_pages(self, delete):
         for batch in batches(delete, 1000):
+            if self.cache:
+                self.cache.invalidate(batch)
             self.db.execute(self.PageContentDb.__table__.delete().where(self.PageContentDb.title.in_(batch)))
+            if self.depends_on:
+                self.db.execute(self.DependencyDb.__table__.delete().where(self.DependencyDb.title.in_(batch)))
             self.db.commit()
 
     def store_object(self, value: PageContent) -> None:
@@ -186,25 +458,44 @@ class ContentStore:
                 last_change -= delta
             else:
                 last_change = None
-        if self.retriever_source and last_change:
+        # Pages whose dependencies have changed since they were generated, see mark_stale()
+        marked = self.find_marked_titles() if self.depends_on and self.retriever_source and not filters else []
+        if self.retriever_source and last_change and not marked:
             ret_ts = self.retriever_source.get_last_change()
             if last_change >= ret_ts:
                 print(f"Skipping {self.filename} refresh, underlying timestamp same as current source")
                 return []
 
-        if last_change and (datetime.utcnow() - last_change < timedelta(minutes=1)):
+        if last_change and not marked and (datetime.utcnow() - last_change < timedelta(minutes=1)):
             print(f"Skipping {self.filename} refresh, underlying timestamp has not changed in last minute")
             return []
 
         # existing_keys, source = self.get_filters(last_change, refresh_type, reporter, start_ts, filters)
-        source, delete = self.get_refresh_source(last_change, reporter, filters)
+        source, delete = self.get_refresh_source(last_change, reporter, filters, progress, marked)
+
+        # Full reloads record how far they got after each saved batch, see get_refresh_source()
+        full_reload = not last_change and not self.retriever_source
+
+        def checkpointed():
+            # The checkpoint must be taken as the batch is formed, before prefetch() runs ahead
+            for b in batches(source, 500):
+                yield b, self.retriever.checkpoint
 
         titles: Set[str] = set()
-        for batch in batches(source, 500):
-            self.save_pages(batch)
+        # Including the deleted ones, to mark the pages of the dependent stores
+        changed: Set[str] = set(delete)
+        source_batches = checkpointed()
+        if self.pipeline:
+            source_batches = prefetch(source_batches, self.pipeline)
+        for batch, checkpoint in source_batches:
+            self.save_pages(batch, progress)
+            if full_reload and checkpoint:
+                self.set_continuation(refresh_continuation + checkpoint)
             for v in batch:
+                if self.dependents:
+                    changed.add(v.title)
                 if not v.is_deleted():
-                    progress['saved'] += 1
+                    count_progress(progress, 'saved')
                     if v.timestamp and (not last_change or v.timestamp > last_change):
                         last_change = v.timestamp
                     titles.add(v.title)
@@ -212,47 +503,97 @@ class ContentStore:
         if delete:
             self.delete_pages(delete)
             print(f"Removed {len(delete):,} items from {self.filename}")
+        if marked:
+            # Regenerated, or no longer produced by the retriever
+            self.clear_marks(marked)
+        for store in self.dependents:
+            store.mark_stale(changed)
 
         if self.retriever_source:
-            self.set_last_change(self.retriever_source.get_last_change())
+            last_change = self.retriever_source.get_last_change()
+        else:
+            # A resumed full reload may not have seen any page newer than those saved by the earlier runs
+            if full_reload:
+                last_change = self.get_max_timestamp() or datetime.utcnow()
+            last_change -= timedelta(minutes=5)
+        if full_reload:
+            self.set_info(timestamp=last_change, continuation=None)
         else:
-            self.set_last_change(last_change - timedelta(minutes=5))
+            self.set_last_change(last_change)
 
         return titles
 
-    def get_refresh_source(self, last_change, reporter, filters):
+    def get_refresh_source(self, last_change, reporter, filters, progress, marked: List[str] = None):
         delete = []
         if not last_change or self.retriever.source:
-            existing = self.get_stored_titles(self.db, self.PageContentDb, filters)
             if self.retriever_source:
-                if last_change:
-                    filters = [self.retriever_source.PageContentDb.timestamp > last_change, *(filters or [])]
-                available = self.get_stored_titles(
-                    self.retriever_source.db, self.retriever_source.PageContentDb, filters)
-                source = self.retriever.get_titles(
-                    {k: available[k] for k in available if k not in existing or existing[k] < available[k]},
-                    force=False,
-                    progress_reporter=reporter)
-                if not last_change and not filters:
-                    delete = {k for k in existing if k not in available}
+                if not filters:
+                    titles = self.find_stale_titles(last_change)
+                    if marked:
+                        print(f"Regenerating {len(marked):,} pages of {self.filename} with changed dependencies")
+                        titles = unique_sorted(heapq.merge(titles, marked))
+                    source = self.retriever.get_titles(titles, force=False, progress_reporter=reporter)
+                    if not last_change:
+                        delete = list(self.find_orphaned_titles())
+                else:
+                    # Arbitrary filters cannot be applied to both sides of the join,
+                    # so merge two title-ordered cursors instead
+                    source_filters = filters
+                    if last_change:
+                        source_filters = [self.retriever_source.PageContentDb.timestamp > last_change, *filters]
+
+                    def changed_titles():
+                        for title, existing, available in outer_join_sorted(
+                                self.iter_stored_titles(filters),
+                                self.retriever_source.iter_stored_titles(source_filters)):
+                            if available is not None and (existing is None or existing[1] < available[1]):
+                                yield title
+
+                    source = self.retriever.get_titles(changed_titles(), force=False, progress_reporter=reporter)
                 msg = f"Refreshing {self.filename} from underlying source. Last change at {last_change}, "
                 if last_change:
                     msg += f"catching up {trim_timedelta(datetime.utcnow() - last_change)}"
                 else:
                     msg += f"full refresh"
             else:
-                print(f"Store {self.filename} has no last timestamp, forcing full reload")
+                continuation = self.get_continuation()
+                self.retriever.resume_from = None
+                if continuation and continuation.startswith(refresh_continuation):
+                    self.retriever.resume_from = continuation[len(refresh_continuation):]
+                    print(f"Store {self.filename} has no last timestamp, resuming full reload "
+                          f"from {self.retriever.resume_from}")
+                else:
+                    print(f"Store {self.filename} has no last timestamp, forcing full reload")
+                self.retriever.checkpoint = None
+                self.retriever.split_points = self.title_split_points(self.retriever.partitions)
+                with self.read_session() as reader:
+                    existing = self.get_stored_titles(reader, self.PageContentDb, filters)
                 source = self.retriever.get_all_titles(reporter, existing, filters)
         else:
-            source = self.retriever.get_titles(
-                (v[0] for v in self.retriever.find_recent_changes(last_change - timedelta(seconds=5))),
-                force=False,
-                progress_reporter=reporter)
+            titles = (v[0] for v in self.retriever.find_recent_changes(last_change - timedelta(seconds=5)))
+            if self.check_revisions:
+                titles = self.skip_current_revisions(titles, reporter, progress)
+            source = self.retriever.get_titles(titles, force=False, progress_reporter=reporter)
             print(f"Refreshing {self.filename} with the new changes. Last change at {last_change}, "
                   f"catching up {trim_timedelta(datetime.utcnow() - last_change)}")
 
         return source, delete
 
+    def skip_current_revisions(self, titles: Iterable[str], reporter, progress) -> Iterable[str]:
+        for batch in batches(titles, 500):
+            changed = set(self.retriever.find_changed(batch, self.get_revisions(batch)))
+            for title in batch:
+                if title in changed:
+                    yield title
+                else:
+                    count_progress(progress, 'unchanged')
+                    reporter(title)
+
+    def get_revisions(self, titles: Iterable[str]) -> Dict[str, int]:
+        with self.read_session() as reader:
+            return dict(reader.query(self.PageContentDb.title, self.PageContentDb.revid)
+                        .filter(self.PageContentDb.title.in_(titles)))
+
     @staticmethod
     def get_stored_titles(db, obj_type, filters):
         query = db.query(obj_type).filter(obj_type.timestamp is not None)
@@ -261,38 +602,184 @@ class ContentStore:
         query = query.with_entities(obj_type.title, obj_type.timestamp)
         return {p[0]: p[1] for p in query}
 
+    def find_stale_titles(self, since: datetime = None) -> Iterable[str]:
+        """Titles in the source store that are missing here, or that have changed since they were stored here.
+        If since is given, only looks at the source pages changed after it."""
+        pages, src = self.PageContentDb.__table__.alias('dst'), self.source_pages.alias('src')
+        query = select([src.c.title]) \
+            .select_from(src.outerjoin(pages, pages.c.title == src.c.title)) \
+            .where(or_(pages.c.title.is_(None), pages.c.timestamp < src.c.timestamp))
+        if since:
+            query = query.where(src.c.timestamp > since)
+        with self.read_session() as reader:
+            yield from (row[0] for row in reader.execute(query.order_by(src.c.title)))
+
+    def find_orphaned_titles(self) -> Iterable[str]:
+        """Titles stored here that no longer exist in the source store"""
+        pages, src = self.PageContentDb.__table__.alias('dst'), self.source_pages.alias('src')
+        query = select([pages.c.title]).where(~exists().where(src.c.title == pages.c.title))
+        with self.read_session() as reader:
+            yield from (row[0] for row in reader.execute(query))
+
+    def iter_stored_titles(self, filters=None) -> Iterable[Tuple[str, datetime]]:
+        """Stream (title, timestamp) of all stored pages, ordered by title"""
+        with self.read_session() as reader:
+            query = reader.query(self.PageContentDb.title, self.PageContentDb.timestamp)
+            if filters:
+                query = query.filter(*(self.rebind_filter(v) for v in filters))
+            yield from query.order_by(self.PageContentDb.title).yield_per(1000)
+
+    def changed_since(self, timestamp: datetime, columns: Iterable[str] = ('title', 'timestamp')) -> Iterable[tuple]:
+        """Stream tuples with the given columns of the pages modified after the timestamp, oldest first.
+        Uses the timestamp index, and never loads the columns that were not asked for."""
+        table = self.PageContentDb.__table__
+        query = select([table.c[v] for v in columns]) \
+            .where(table.c.timestamp > timestamp) \
+            .order_by(table.c.timestamp)
+        with self.read_session() as reader:
+            yield from (self.decompress_row(columns, row) for row in reader.execute(query))
+
+    def rebind_filter(self, expression):
+        """Filters are often built from another store's columns, e.g. when the same filter
+        is used for both a store and its source. Point them to this store's pages table."""
+        table = self.PageContentDb.__table__
+
+        def replace(element):
+            if isinstance(element, Column) and element.table is not table and element.table.name == table.name:
+                return table.c[element.name]
+            return None
+
+        return replacement_traverse(expression, {}, replace)
+
     def get_last_change(self):
         try:
-            for info in self.db.query(self.InfoDb):
-                return info.timestamp
+            with self.read_session() as reader:
+                for info in reader.query(self.InfoDb):
+                    return info.timestamp
         except KeyError:
             return None
 
+    def title_split_points(self, count: int) -> List[str]:
+        """Stored titles that split all stored titles into count ranges of about the same size"""
+        if count < 2:
+            return []
+        with self.read_session() as reader:
+            total = reader.query(self.PageContentDb.title).count()
+            if total < count * 100:
+                return []
+            query = reader.query(self.PageContentDb.title).order_by(self.PageContentDb.title)
+            return [query.offset(total * idx // count).limit(1).scalar() for idx in range(1, count)]
+
+    def get_max_timestamp(self) -> Union[datetime, None]:
+        with self.read_session() as reader:
+            return reader.query(func.max(self.PageContentDb.timestamp)).scalar()
+
     def set_last_change(self, last_change: datetime):
+        self.set_info(timestamp=last_change)
+
+    def get_continuation(self) -> Union[str, None]:
+        with self.read_session() as reader:
+            for info in reader.query(self.InfoDb):
+                return info.continuation
+
+    def set_continuation(self, continuation: Union[str, None]):
+        self.set_info(continuation=continuation)
+
+    def set_info(self, **values):
         for info in self.db.query(self.InfoDb):
-            info.timestamp = last_change
+            for key, value in values.items():
+                setattr(info, key, value)
             self.db.commit()
             return
-        info = self.InfoDb(timestamp=last_change)
+        info = self.InfoDb(**values)
         self.db.add(info)
         self.db.commit()
 
     def get_all(self, filters=None, order_by=None, columns=None) -> Iterable[PageContent]:
-        query = self.db.query(self.PageContentDb)
+        with self.read_session() as reader:
+            query = reader.query(self.PageContentDb).options(load_payload)
+            if filters is not None:
+                if not isinstance(filters, list):
+                    filters = [filters]
+                query = query.filter(*filters)
+            if order_by is not None:
+                if not isinstance(order_by, list):
+                    order_by = [order_by]
+                query = query.order_by(*order_by)
+            if columns is not None:
+                if not isinstance(columns, list):
+                    columns = [columns]
+                yield from query.with_entities(*columns)
+            else:
+                yield from (v.to_content() for v in query)
+
+    def iter_rows(self, fields: Iterable[str] = ('title',), filters=None, order_by=None) -> Iterable[PageRow]:
+        """Stream lightweight rows with just the requested fields, avoiding the cost of building
+        a PageContent. The data field, if requested, is decoded on first access."""
+        table = self.PageContentDb.__table__
+        fields = {v: idx for idx, v in enumerate(fields)}
+        query = select([table.c[v] for v in fields])
         if filters is not None:
             if not isinstance(filters, list):
                 filters = [filters]
-            query = query.filter(*filters)
+            if filters:
+                query = query.where(and_(*filters))
         if order_by is not None:
             if not isinstance(order_by, list):
                 order_by = [order_by]
             query = query.order_by(*order_by)
-        if columns is not None:
-            if not isinstance(columns, list):
-                columns = [columns]
-            yield from query.with_entities(*columns)
-        else:
-            yield from (v.to_content() for v in query)
+        with self.read_session() as reader:
+            yield from (PageRow(fields, self.decompress_row(fields, row)) for row in reader.execute(query))
+
+    def decompress_row(self, columns: Iterable[str], row) -> tuple:
+        if not self.compressor:
+            return tuple(row)
+        return tuple(self.compressor.decompress(v) if c in self.compressor.columns else v
+                     for c, v in zip(columns, row))
+
+    def train_compression(self, sample_size: int = 10000, dict_size: int = 256 * 1024) -> None:
+        """Train a new dictionary for each compressed column from a random sample of the stored values"""
+        table = self.PageContentDb.__table__
+        for column in self.compressor.columns:
+            query = select([table.c[column]]).where(table.c[column].isnot(None)) \
+                .order_by(text('random()')).limit(sample_size)
+            with self.read_session() as reader:
+                samples = [self.decompress(row[0]) for row in reader.execute(query)]
+            if not samples:
+                print(f"Nothing to train the {column} dictionary for {self.filename} on")
+                continue
+            dictionary = self.compressor.train(samples, dict_size)
+            dict_id = self.compressor.add_dictionary(column, dictionary)
+            self.db.merge(self.DictionaryDb(
+                dict_id=dict_id, column=column, timestamp=datetime.utcnow(), dictionary=dictionary))
+            self.db.commit()
+            print(f"Trained {len(dictionary):,} byte dictionary #{dict_id} for {column} "
+                  f"in {self.filename} from {len(samples):,} samples")
+
+    def migrate_compression(self, retrain: bool = False) -> None:
+        """Compress (or re-compress with the latest dictionaries) all stored values, and shrink the db file"""
+        if not self.compressor:
+            raise ValueError(f"Compression is not enabled for {self.filename}")
+        if retrain or not self.compressor.compressors:
+            self.train_compression()
+        table = self.PageContentDb.__table__
+        columns = sorted(self.compressor.columns)
+        update = table.update().where(table.c.title == bindparam('key')).values(
+            **{c: bindparam(f'new_{c}') for c in columns})
+        query = select([table.c.title, *(table.c[c] for c in columns)])
+        count = 0
+        with self.read_session() as reader:
+            rows = (self.decompress_row(['title', *columns], row) for row in reader.execute(query))
+            for batch in batches(rows, self.batch_size):
+                self.db.execute(update, [
+                    dict(key=row[0], **{f'new_{c}': self.compressor.compress(c, v) for c, v in zip(columns, row[1:])})
+                    for row in batch])
+                self.db.commit()
+                count += len(batch)
+        print(f"Compressed {count:,} pages in {self.filename}, vacuuming")
+        self.db.close()
+        self.engine.execute('VACUUM')
+        self.engine.execute('PRAGMA wal_checkpoint(TRUNCATE)')
 
     def dump_to_file(self, filename: Path,
                      page_filter: Callable[[PageContent], bool] = None,
@@ -314,16 +801,19 @@ class ContentStore:
     def _track_progress(self, func: Callable[..., T], *args) -> T:
         start_ts = datetime.utcnow()
         processed = 0
-        progress = {'saved': 0}
+        progress = {'saved': 0, 'unchanged': 0}
         last_report_ts = start_ts
 
         def reporter(title):
             nonlocal last_report_ts, processed
-            processed += 1
-            if processed % 100 == 0 and (datetime.utcnow() - last_report_ts).total_seconds() >= 15:
+            with progress_lock:
+                processed += 1
+                if processed % 100 or (datetime.utcnow() - last_report_ts).total_seconds() < 15:
+                    return
                 last_report_ts = datetime.utcnow()
                 seconds = (last_report_ts - start_ts).total_seconds()
                 print(f"Processed {processed:,} and saved {progress['saved']:,} items "
+                      f"({progress['unchanged']:,} unchanged) "
                       f"in {trim_timedelta(last_report_ts - start_ts)}. "
                       f"Processing speed {int(processed / seconds):,}, "
                       f"save speed {int(progress['saved'] / seconds):,} items/s. "
@@ -332,7 +822,8 @@ class ContentStore:
         result = func(progress, reporter, *args)
 
         now = datetime.utcnow()
-        print(f"Finished refreshing {self.filename}: {progress['saved']:,} pages in {trim_timedelta(now - start_ts)}")
+        print(f"Finished refreshing {self.filename}: {progress['saved']:,} pages "
+              f"({progress['unchanged']:,} unchanged) in {trim_timedelta(now - start_ts)}")
 
         return result
 
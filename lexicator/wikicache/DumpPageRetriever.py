@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Callable, Iterable, Tuple, Dict, Union
+
+from .MultistreamDumpReader import MultistreamDumpReader
+from .PageContent import PageContent
+from .PageRetriever import PageRetriever
+from .WikipageDownloader import WikipageDownloader
+from .utils import batches
+
+
+class DumpPageRetriever(PageRetriever):
+    """
+    Offline retriever that reads pages from a local multistream dump instead of the API.
+    The pages are converted by the given downloader, so the stored result is the same as when downloading them.
+    Titles that are not in the dump are treated as deleted."""
+
+    def __init__(self, downloader: WikipageDownloader, reader: MultistreamDumpReader, batch_size: int = 5000):
+        super().__init__(log_config=downloader.log_config)
+        self.downloader = downloader
+        self.reader = reader
+        self.batch_size = batch_size
+        self.namespace = downloader.namespace
+
+    @property
+    def follow_redirects(self) -> bool:
+        return self.downloader.follow_redirects
+
+    def find_recent_changes(self, last_change: datetime) -> Iterable[Tuple[str, datetime]]:
+        return []
+
+    def get_titles(self,
+                   source: Iterable[str],
+                   force: Union[bool, str],
+                   progress_reporter: Callable[[str], None] = None) -> Iterable[PageContent]:
+        for batch in batches(source, self.batch_size):
+            print(f"DUMP: read {len(batch)} titles from {self.reader.filename}")
+            pages = self.reader.get_pages(set(batch))
+            for title in batch:
+                page = pages.get(title)
+                val = self.dump_page_to_content(page) if page else None
+                yield val or PageContent(title=title)  # missing or skipped pages are deleted
+                if progress_reporter:
+                    progress_reporter(title)
+
+    def dump_page_to_content(self, page) -> Union[PageContent, None]:
+        return self.downloader.dump_page_to_content(page)
+
+    def get_all_titles(self, progress_reporter: Callable[[str], None],
+                       exclude: Dict[str, datetime] = None,
+                       filters=None) -> Iterable[PageContent]:
+        if filters and len(filters) > 0:
+            raise ValueError('Filters not supported')
+        for page in self.reader:
+            if exclude and page.title in exclude:
+                continue
+            val = self.dump_page_to_content(page)
+            if val:
+                yield val
+                if progress_reporter:
+                    progress_reporter(val.title)
+
+    def can_refresh(self) -> bool:
+        return True
@@ -14,8 +14,8 @@ from .utils import trim_timedelta, to_json, LogConfig, MwSite
 
 class LexemeDownloader(WikipageDownloader):
     def __init__(self, wikidata_site: MwSite, wdqs_site: WikidataQueryService,
-                 lang_code: str, log_config: LogConfig):
-        super().__init__(site=wikidata_site, namespace=NS_LEXEME, log_config=log_config)
+                 lang_code: str, log_config: LogConfig, concurrency: int = 1):
+        super().__init__(site=wikidata_site, namespace=NS_LEXEME, log_config=log_config, concurrency=concurrency)
         self.lang_code = lang_code
         self.find_recent_changes_query['rctype'] = 'log'  # only look at the log entries
         self.wdqs = wdqs_site
@@ -67,7 +67,10 @@ SELECT ?lexemeId ?ts WHERE {{
             return ('Lexeme:' + entity_id(r['lexemeId']) for r in res)
 
     def find_titles(self) -> Iterable[str]:
-        yield from self.query_wdqs()
+        # WDQS returns lexemes in no particular order, sort them to make the full reload resumable
+        for title in sorted(self.query_wdqs()):
+            if not self.resume_from or title >= self.resume_from:
+                yield title
 
     def find_recent_changes(self, last_change: datetime) -> Iterable[Tuple[str, datetime]]:
         # detect deleted lexemes using RC log, modified and redirected using wdqs
@@ -87,11 +90,12 @@ SELECT ?lexemeId ?ts WHERE {{
     def to_content(self, page) -> Union[PageContent, None]:
         p = super().to_content(page)
         if p:
-            data = json.loads(p.content)
-            p = dataclasses.replace(
-                p, data=data['lemmas'][self.lang_code]['value'], content=to_json(data))
+            p = self.with_entity(p, json.loads(p.content))
         return p
 
+    def with_entity(self, page: PageContent, entity: dict) -> PageContent:
+        return dataclasses.replace(page, data=entity['lemmas'][self.lang_code]['value'], content=to_json(entity))
+
     # def get_existing_lexemes(self) -> Dict[str, Dict[str, List]]:
     #     if not self.lexemes or not self.lexical_categories:
     #         return {}
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Tuple, Dict, Union, TYPE_CHECKING
+
+from pywikiapi import to_datetime
+
+from lexicator.consts import NS_LEXEME
+from .LexemeDownloader import LexemeDownloader
+from .PageContent import PageContent
+from .PageRetriever import PageRetriever
+from .XmlDumpReader import open_dump
+from .utils import trim_timedelta
+
+if TYPE_CHECKING:
+    from .ContentStore import ContentStore
+
+# Keys of the lexeme JSON stored in a revision, in their order. Dump entities also have pageid, ns, title,
+# lastrevid and modified, but not nextFormId and nextSenseId.
+revision_keys = ['type', 'id', 'lemmas', 'lexicalCategory', 'language', 'claims', 'nextFormId', 'nextSenseId',
+                 'forms', 'senses']
+dump_only_keys = ['pageid', 'ns', 'title', 'lastrevid', 'modified']
+
+
+def next_sub_id(items: list, separator: str) -> int:
+    """Next form or sense number, e.g. 3 for forms L1-F1 and L1-F2. Deleted forms are not in the dump,
+    so this is lower than the real counter if the last form was deleted."""
+    return 1 + max((int(v['id'].rsplit(separator, 1)[1]) for v in items), default=0)
+
+
+class LexemeDumpReader(PageRetriever):
+    """
+    Offline retriever that reads the lexemes of one language from a local latest-lexemes.json.bz2 (or .gz) dump.
+    The dump is a JSON array with one entity per line, so it is parsed line by line without loading it whole.
+    Pages are converted by the downloader, so they have the same data/content as the ones from the API.
+    Reading can start at any line offset of the uncompressed dump to resume an interrupted load."""
+
+    def __init__(self, downloader: LexemeDownloader, filename: Path):
+        super().__init__(log_config=downloader.log_config)
+        self.downloader = downloader
+        self.filename = filename
+
+    def read(self, offset: int = 0) -> Iterable[Tuple[int, PageContent]]:
+        """Yields (offset of the next line, page) for each lexeme of the downloader's language"""
+        with open_dump(self.filename) as file:
+            if offset:
+                # Compressed files are seekable, but only by decompressing everything up to the offset
+                file.seek(offset)
+            for line in iter(file.readline, b''):
+                line = line.strip().rstrip(b',')
+                if not line or line in (b'[', b']'):
+                    continue
+                entity = json.loads(line)
+                if entity.get('language') != self.downloader.q_language:
+                    continue
+                page = self.entity_to_content(entity)
+                if page:
+                    yield file.tell(), page
+
+    def entity_to_content(self, entity: dict) -> Union[PageContent, None]:
+        try:
+            page = PageContent(title='Lexeme:' + entity['id'], ns=NS_LEXEME,
+                               timestamp=to_datetime(entity['modified']), revid=entity.get('lastrevid'))
+            page = self.downloader.with_entity(page, self.entity_to_revision(entity))
+        except (KeyError, ValueError) as err:
+            print(f"Lexeme {entity.get('id')} has no useful content: {err}")
+            return None
+        return page
+
+    @staticmethod
+    def entity_to_revision(entity: dict) -> dict:
+        """Same JSON as the lexeme page content that the API returns, so that both produce identical rows"""
+        entity = {k: v for k, v in entity.items() if k not in dump_only_keys}
+        if 'nextFormId' not in entity:
+            entity['nextFormId'] = next_sub_id(entity.get('forms', []), '-F')
+        if 'nextSenseId' not in entity:
+            entity['nextSenseId'] = next_sub_id(entity.get('senses', []), '-S')
+        result = {k: entity[k] for k in revision_keys if k in entity}
+        result.update((k, v) for k, v in entity.items() if k not in result)
+        return result
+
+    @property
+    def follow_redirects(self) -> bool:
+        return False
+
+    def find_recent_changes(self, last_change: datetime) -> Iterable[Tuple[str, datetime]]:
+        return []
+
+    def get_titles(self,
+                   source: Iterable[str],
+                   force: Union[bool, str],
+                   progress_reporter: Callable[[str], None] = None) -> Iterable[PageContent]:
+        raise ValueError('Lexemes dump does not support reading individual titles')
+
+    def get_all_titles(self, progress_reporter: Callable[[str], None],
+                       exclude: Dict[str, datetime] = None,
+                       filters=None) -> Iterable[PageContent]:
+        if filters and len(filters) > 0:
+            raise ValueError('Filters not supported')
+        for _, page in self.read():
+            if not exclude or page.title not in exclude:
+                yield page
+                if progress_reporter:
+                    progress_reporter(page.title)
+
+    def can_refresh(self) -> bool:
+        return True
+
+
+def import_lexeme_dump(reader: LexemeDumpReader, store: ContentStore, batch_size: int = 1000) -> None:
+    """
+    Bulk-load lexemes from a JSON dump. After each saved batch, the dump offset is kept in the store's info table,
+    so that an interrupted import continues where it stopped when started again with the same dump."""
+    prefix = f'{reader.filename.name}:'
+    offset = 0
+    continuation = store.get_continuation()
+    if continuation and continuation.startswith(prefix):
+        offset = int(continuation[len(prefix):])
+        print(f"Resuming import of {reader.filename} into {store.filename} at offset {offset:,}")
+    start_ts = datetime.utcnow()
+    batch = []
+    count = 0
+
+    def save():
+        nonlocal count
+        store.save_pages(batch)
+        store.set_continuation(f'{prefix}{offset}')
+        count += len(batch)
+        batch.clear()
+
+    for offset, page in reader.read(offset):
+        batch.append(page)
+        if len(batch) >= batch_size:
+            save()
+            if count % (batch_size * 50) == 0:
+                print(f"Imported {count:,} lexemes from {reader.filename} in "
+                      f"{trim_timedelta(datetime.utcnow() - start_ts)}, current lexeme is {page.title}")
+    save()
+
+    # A resumed run has only seen a part of the dump, so use the newest stored lexeme
+    last_change = store.get_max_timestamp()
+    store.set_info(timestamp=last_change, continuation=None)
+    print(f"Imported {count:,} lexemes into {store.filename}, last change is {last_change}")
@@ -0,0 +1,91 @@
+import bz2
+import os
+import xml.etree.ElementTree as ElementTree
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Tuple, Set, Dict, Union
+
+from pywikiapi import AttrDict
+
+from .XmlDumpReader import XmlDumpReader, page_element_to_api, local_name
+from .utils import ordered_map
+
+
+def read_stream(filename: str, start: int, end: int) -> List[AttrDict]:
+    """Decompress and parse one bz2 stream of a multistream dump. Runs in a worker process."""
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = bz2.decompress(file.read(end - start if end else -1))
+    # Each stream is a sequence of <page> elements without a root. The last one may be followed by the footer.
+    data = data.replace(b'</mediawiki>', b'')
+    root = ElementTree.fromstring(b'<pages>' + data + b'</pages>')
+    return [page_element_to_api(v) for v in root if local_name(v.tag) == 'page']
+
+
+class MultistreamDumpReader(XmlDumpReader):
+    """
+    Read a pages-articles-multistream.xml.bz2 dump using its multistream-index.txt.bz2.
+    The index lists the offset of the bz2 stream holding every page, and each stream holds about 100 pages,
+    so the streams can be decompressed and parsed independently in a process pool.
+    Pages are still returned in the dump order, with a bounded number of streams in flight."""
+
+    def __init__(self, filename: Path, index: Path, processes: int = None) -> None:
+        super().__init__(filename)
+        self.index = index
+        self.processes = processes or os.cpu_count()
+        # Parsed once on first use: title -> stream offset, and the sorted start offsets of all streams
+        self._title_offsets: Union[Dict[str, int], None] = None
+        self._offsets: Union[List[int], None] = None
+        self._executor: Union[ProcessPoolExecutor, None] = None
+
+    def read_index(self) -> Iterable[Tuple[int, str]]:
+        """Yields (stream offset, title) for every page in the dump"""
+        with bz2.open(self.index, 'rt', encoding='utf-8') as file:
+            for line in file:
+                offset, _, title = line.rstrip('\n').split(':', 2)
+                yield int(offset), title
+
+    def load_index(self) -> None:
+        if self._title_offsets is None:
+            title_offsets = {}
+            for offset, title in self.read_index():
+                title_offsets[title] = offset
+            self._offsets = sorted(set(title_offsets.values()))
+            self._title_offsets = title_offsets
+
+    def stream_ranges(self, offsets: Iterable[int]) -> List[Tuple[int, int]]:
+        """Convert stream start offsets into sorted (start, end) byte ranges. The last stream runs to the end."""
+        self.load_index()
+        result = []
+        for start in sorted(set(offsets)):
+            idx = bisect_right(self._offsets, start)
+            result.append((start, self._offsets[idx] if idx < len(self._offsets) else 0))
+        return result
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __iter__(self) -> Iterable[AttrDict]:
+        self.load_index()
+        yield from self.read_ranges(self.stream_ranges(self._offsets))
+
+    def read_ranges(self, ranges: List[Tuple[int, int]]) -> Iterable[AttrDict]:
+        streams = ((str(self.filename), start, end) for start, end in ranges)
+        for pages in ordered_map(self.executor, read_stream, streams, self.processes * 2):
+            for page in pages:
+                yield self.track_timestamp(page)
+
+    def get_pages(self, titles: Set[str]) -> Dict[str, AttrDict]:
+        """Read just the given pages. Only the streams that contain them are decompressed."""
+        self.load_index()
+        offsets = (self._title_offsets[v] for v in titles if v in self._title_offsets)
+        return {page.title: page for page in self.read_ranges(self.stream_ranges(offsets)) if page.title in titles}
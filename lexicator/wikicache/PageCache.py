@@ -0,0 +1,75 @@
+import dataclasses
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Tuple, Dict, Union
+
+from .PageContent import PageContent
+
+
+def encoded_size(value: Union[str, None]) -> int:
+    return len(value.encode('utf-8')) if value else 0
+
+
+class PageCache:
+    """
+    In-memory LRU cache of stored pages, bounded by the size of the cached values in bytes, as UTF-8.
+    The data field is kept as JSON and decoded on every hit, so callers never share mutable objects.
+    Safe to use from several threads. The owning ContentStore is responsible for invalidating the pages
+    it writes or deletes. Hit, miss, and eviction counters help to pick the cache size for each store."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.pages: Dict[str, Tuple[PageContent, Union[str, None], int]] = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, title: str) -> Union[PageContent, None]:
+        with self.lock:
+            try:
+                page, data, _ = self.pages[title]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(title)
+            self.hits += 1
+        return page if data is None else dataclasses.replace(page, data=json.loads(data))
+
+    def put(self, page: PageContent) -> None:
+        data = None if page.data is None else json.dumps(page.data, ensure_ascii=False)
+        size = encoded_size(page.title) + encoded_size(page.content) + encoded_size(data)
+        if size > self.max_bytes:
+            return
+        page = dataclasses.replace(page, data=None, dependencies=None)
+        with self.lock:
+            self._remove(page.title)
+            self.pages[page.title] = (page, data, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self.pages.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, titles: Iterable[str]) -> None:
+        with self.lock:
+            for title in titles:
+                self._remove(title)
+
+    def _remove(self, title: str) -> None:
+        value = self.pages.pop(title, None)
+        if value:
+            self.size -= value[2]
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        pages=len(self.pages), size=self.size, max_bytes=self.max_bytes)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = f"{self.hits / lookups:.1%}" if lookups else 'n/a'
+        return (f"{self.hits:,} hits, {self.misses:,} misses ({hit_rate} hit rate), {self.evictions:,} evictions, "
+                f"{len(self.pages):,} pages using {self.size:,} of {self.max_bytes:,} bytes")
@@ -1,7 +1,7 @@
 import dataclasses
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import Any, List
 
 from .utils import clean_empty_vals, to_compact_json
 
@@ -16,6 +16,9 @@ class PageContent:
     redirect: str = None
     content: str = None
     data: Any = None
+    # Titles of the pages in the depends_on store this page was generated from, e.g. the expanded templates.
+    # Saved to the dependencies table rather than with the page, None if unknown.
+    dependencies: List[str] = None
 
     def to_dict(self):
         obj = clean_empty_vals(dataclasses.asdict(self))
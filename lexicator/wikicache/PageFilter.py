@@ -14,8 +14,7 @@ def update_content(page, data, content=None):
 class PageFilter(PageRetriever):
     def find_recent_changes(self, last_change: datetime) -> Iterable[Tuple[str, datetime]]:
         self.source.refresh()
-        yield from ((p.title, p.timestamp) for p in self.source.get_all()
-                    if p.timestamp and p.timestamp > last_change)
+        yield from self.source.changed_since(last_change)
 
     def get_titles(self,
                    source: Iterable[str],
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Iterable, Tuple, Union, Callable, Dict, TYPE_CHECKING
+from typing import Iterable, Tuple, Union, Callable, Dict, List, TYPE_CHECKING
 
 from .PageContent import PageContent
 from .utils import LogConfig
@@ -17,6 +17,14 @@ class PageRetriever(ABC):
         self.log_config = log_config or LogConfig(print_warnings=True, verbose=True)
         self.source: ContentStore = source
         self.is_remote = is_remote
+        # Full reloads of the retrievers that return titles in a stable sorted order can be resumed:
+        # get_all_titles() starts at resume_from, and keeps checkpoint at a title
+        # such that all the pages before it have already been returned
+        self.resume_from: Union[str, None] = None
+        self.checkpoint: Union[str, None] = None
+        # Full reloads may crawl this many title ranges at once, split at split_points drawn from the store
+        self.partitions = 1
+        self.split_points: List[str] = []
 
     def init(self):
         pass
@@ -44,6 +52,10 @@ class PageRetriever(ABC):
             -> Iterable[PageContent]:
         pass
 
+    def find_changed(self, titles: List[str], revisions: Dict[str, int]) -> Iterable[str]:
+        """Given the stored revision ids, return the titles that need to be downloaded again"""
+        return titles
+
     def refresh_source(self, progress, reporter):
         pass
 
@@ -0,0 +1,32 @@
+import json
+from typing import Dict, Tuple, Any
+
+_not_decoded = object()
+
+
+class PageRow:
+    """
+    A lightweight read-only view of a stored page that only holds the requested fields.
+    Unlike PageContent, the data field is decoded from JSON on first access, not when the row is read."""
+
+    __slots__ = ('_fields', '_values', '_data')
+
+    def __init__(self, fields: Dict[str, int], values: Tuple[Any, ...]) -> None:
+        self._fields = fields
+        self._values = values
+        self._data = _not_decoded
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            index = self._fields[name]
+        except KeyError:
+            raise AttributeError(f"Field {name} was not requested, available fields: {', '.join(self._fields)}")
+        if name == 'data':
+            if self._data is _not_decoded:
+                value = self._values[index]
+                self._data = None if value is None else json.loads(value)
+            return self._data
+        return self._values[index]
+
+    def __repr__(self) -> str:
+        return f"PageRow({', '.join(f'{k}={self._values[v]!r}' for k, v in self._fields.items())})"
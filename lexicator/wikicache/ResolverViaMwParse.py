@@ -3,7 +3,6 @@ from __future__ import annotations
 import json
 import re
 from datetime import datetime
-from itertools import islice
 from typing import List, Iterable, Tuple, Union, Callable, Dict, TYPE_CHECKING
 
 from mwparserfromhell.nodes import Template
@@ -67,18 +66,15 @@ class ResolverViaMwParse(PageRetriever):
             return []
 
         min_batch_size = 15
-        source_iter = iter(source)
-        batch_size = self.batch_size
-        while True:
-            # take first batch_size items, where batch_size could be adjusted in subsequent calls
-            batch = list(islice(source_iter, batch_size))
-            if not batch:
-                break
-            pages, skipped = self.process_batch(batch)
+        # Expanding too many templates in one call makes the server silently drop some of the results
+        controller = self.site.batch_controller(
+            f'parse {self.template_name}', self.batch_size, min_batch_size, self.batch_size * 4, target_seconds=20)
+        for batch in controller.batches(source):
+            with controller.measure(len(batch)):
+                pages, skipped = self.process_batch(batch)
             yield from pages
-            if skipped and batch_size > min_batch_size:
-                batch_size = max(min_batch_size, batch_size - len(skipped) - 1)
-                print(f"Reduced batch size for {self.template_name} to {batch_size} because of {len(skipped)} skipped")
+            if skipped:
+                controller.limit(len(batch) - len(skipped) - 1)
             all_ignored = []
             while skipped:
                 batch = skipped[:min_batch_size]
@@ -159,7 +155,7 @@ class ResolverViaMwParse(PageRetriever):
         return False
 
     def custom_refresh(self, filters=None) -> Iterable[str]:
-        for page in self.template_source.get_all(filters=filters):
+        for page in self.template_source.iter_rows(['data'], filters=filters):
             if page.data:
                 for dat in page.data:
                     if dat[1] == self.template_name:
@@ -10,9 +10,10 @@ from .utils import LogConfig, MwSite
 
 
 class TemplateDownloader(WikipageDownloader):
-    def __init__(self, site: MwSite, title_filter: Callable[[int, str], bool] = None, log_config: LogConfig = None):
+    def __init__(self, site: MwSite, title_filter: Callable[[int, str], bool] = None, log_config: LogConfig = None,
+                 concurrency: int = 1):
         super().__init__(site=site, namespace=NS_TEMPLATE, title_filter=title_filter, store_redirects=True,
-                         log_config=log_config)
+                         log_config=log_config, concurrency=concurrency)
 
         # noinspection SpellCheckingInspection
         self.re_html_comment = re.compile(r'<!--[\s\S]*?-->')
@@ -11,13 +11,15 @@ class WikidataQueryService:
         'User-Agent': 'Lexicator Bot (User:Yurik, YuriAstrakhan@gmail.com)'
     }
 
-    def __init__(self):
+    def __init__(self, session: requests.Session = None):
         self.rdf_url = 'https://query.wikidata.org/bigdata/namespace/wdq/sparql'
+        # A custom session, e.g. Cassette.session() to record or replay the queries
+        self.session = session
 
     def query(self, sparql):
-        r = requests.post(self.rdf_url,
-                          data=dict(query=sparql),
-                          headers=self.headers)
+        r = (self.session or requests).post(self.rdf_url,
+                                            data=dict(query=sparql),
+                                            headers=self.headers)
         try:
             if not r.ok:
                 print(r.reason)
@@ -1,11 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, Iterable, Tuple, Dict, Union
+from typing import Callable, Iterable, Tuple, Dict, Union, List
 
 from pywikiapi import to_datetime
 
 from .PageContent import PageContent
 from .PageRetriever import PageRetriever
-from .utils import trim_timedelta, batches, to_json, LogConfig, MwSite
+from .BatchController import BatchController
+from .utils import trim_timedelta, to_json, LogConfig, MwSite, ordered_map, title_key
+
+# Where to split the titles while the store is still empty. Latin and other scripts sort before Cyrillic,
+# and the lowercase Cyrillic words take most of the namespace, so split them by the common first letters.
+cyrillic_split_points = ['А', 'а', 'б', 'в', 'г', 'д', 'з', 'и', 'к', 'л', 'м', 'н', 'о', 'п', 'р', 'с', 'т', 'у',
+                         'ф', 'ш']
+
+
+def default_split_points(count: int) -> List[str]:
+    return [cyrillic_split_points[len(cyrillic_split_points) * idx // count] for idx in range(1, count)]
 
 
 class WikipageDownloader(PageRetriever):
@@ -15,13 +26,19 @@ class WikipageDownloader(PageRetriever):
                  follow_redirects: bool = True,
                  store_redirects: bool = False,
                  title_filter: Callable[[int, str], bool] = None,
-                 log_config: LogConfig = None):
+                 log_config: LogConfig = None,
+                 concurrency: int = 1,
+                 partitions: int = 1):
         super().__init__(log_config=log_config, is_remote=True)
         self.site = site
         self.namespace = namespace
         self._follow_redirects = follow_redirects
         self.store_redirects = store_redirects
         self.title_filter = title_filter or (lambda n, t: True)
+        # Number of batch requests to keep in flight in get_titles()
+        self.concurrency = concurrency
+        # Number of title ranges to list at once during a full reload
+        self.partitions = partitions
 
         self.download_titles_query = dict(
             prop=['revisions', 'info'],
@@ -61,32 +78,88 @@ class WikipageDownloader(PageRetriever):
                    progress_reporter: Callable[[str], None] = None) -> Iterable[PageContent]:
         if not self.site:
             return []
-        for batch in batches(source, 250 if self.site.use_bot_limits else 50):
+        source = self.log_batches(self.content_controller().batches(source))
+        if self.concurrency > 1:
+            # Keep several batch requests in flight, but still return the pages in the order of the batches
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                results = ordered_map(executor, self.download_titled_batch, ((v,) for v in source),
+                                      self.concurrency * 2)
+                yield from self.report_pages(results, progress_reporter)
+        else:
+            yield from self.report_pages((self.download_titled_batch(v) for v in source), progress_reporter)
+
+    def report_pages(self, results: Iterable[Tuple[List[str], List[PageContent]]],
+                     progress_reporter: Callable[[str], None] = None) -> Iterable[PageContent]:
+        for batch, pages in results:
+            for page in pages:
+                yield page
+                if progress_reporter:
+                    progress_reporter(page.title)
+            # Only reached once the caller has asked for the page after the last one of this batch
+            self.checkpoint = batch[-1]
+
+    @staticmethod
+    def log_batches(source: Iterable[List[str]]) -> Iterable[List[str]]:
+        # Printed as each batch is sent, from the calling thread
+        for batch in source:
             print(f"API: query {len(batch)} titles: [{', '.join(batch[:3])}{', ...' if len(batch) > 3 else ''}]")
-            for query in self.site.query(**self.download_titles_query, titles=batch, redirects=self.follow_redirects):
-                if 'pages' in query:
-                    for page in query.pages:
-                        # Links to other namespaces are treated as deleted
-                        if 'missing' not in page and page.ns == self.namespace:
-                            val = self.to_content(page)
-                            if val:
-                                yield val
-                        else:
-                            yield PageContent(title=page.title)  # delete it
-                        if progress_reporter:
-                            progress_reporter(page.title)
-
-                if self.store_redirects:
-                    def to_page(row):
-                        return PageContent(title=row['from'], redirect=row['to'])
-                else:
-                    def to_page(row):
-                        return PageContent(title=row['from'])  # mark page for deletion
-
-                if 'normalized' in query:
-                    yield from (to_page(r) for r in query.normalized)
-                if 'redirects' in query:
-                    yield from (to_page(r) for r in query.redirects)
+            yield batch
+
+    def content_controller(self) -> BatchController:
+        # The API allows at most 50 pages with content per request, or 500 with the bot rights
+        limit = 500 if self.site.use_bot_limits else 50
+        return self.site.batch_controller('content', min(250, limit), 10, limit)
+
+    def download_titled_batch(self, batch: List[str]) -> Tuple[List[str], List[PageContent]]:
+        return batch, self.download_batch(batch)
+
+    def download_batch(self, batch: List[str]) -> List[PageContent]:
+        with self.content_controller().measure(len(batch)):
+            return self._download_batch(batch)
+
+    def _download_batch(self, batch: List[str]) -> List[PageContent]:
+        result = []
+        for query in self.site.query(**self.download_titles_query, titles=batch, redirects=self.follow_redirects):
+            if 'pages' in query:
+                for page in query.pages:
+                    # Links to other namespaces are treated as deleted
+                    if 'missing' not in page and page.ns == self.namespace:
+                        val = self.to_content(page)
+                        if val:
+                            result.append(val)
+                    else:
+                        result.append(PageContent(title=page.title))  # delete it
+
+            if self.store_redirects:
+                def to_page(row):
+                    return PageContent(title=row['from'], redirect=row['to'])
+            else:
+                def to_page(row):
+                    return PageContent(title=row['from'])  # mark page for deletion
+
+            if 'normalized' in query:
+                result.extend(to_page(r) for r in query.normalized)
+            if 'redirects' in query:
+                result.extend(to_page(r) for r in query.redirects)
+        return result
+
+    def find_changed(self, titles: List[str], revisions: Dict[str, int]) -> Iterable[str]:
+        # A cheap query without the content. Titles that are not stored yet do not need to be checked.
+        if not self.site:
+            return titles
+        limit = 500 if self.site.use_bot_limits else 50
+        controller = self.site.batch_controller('info', limit, 10, limit)
+        unchanged = set()
+        for batch in controller.batches(v for v in titles if revisions.get(v)):
+            with controller.measure(len(batch)):
+                for query in self.site.query(prop='info', titles=batch):
+                    for page in query.get('pages', []):
+                        if 'missing' not in page and 'redirect' not in page \
+                                and page.get('lastrevid') == revisions.get(page.title):
+                            unchanged.add(page.title)
+        if unchanged:
+            print(f"API: {len(unchanged):,} of {len(titles):,} changed titles are already up to date")
+        return [v for v in titles if v not in unchanged]
 
     def to_content(self, page) -> Union[PageContent, None]:
         try:
@@ -100,15 +173,54 @@ class WikipageDownloader(PageRetriever):
             print(f"Page {page} has no useful content in {to_json(page)}: {err}")
             return None
 
+    def dump_page_to_content(self, page) -> Union[PageContent, None]:
+        """Convert a page read by XmlDumpReader, skipping the pages this downloader would not store"""
+        if page.ns != self.namespace or not self.title_filter(page.ns, page.title):
+            return None
+        if 'redirect' in page:
+            return PageContent(title=page.title, redirect=page.redirect) if self.store_redirects else None
+        return self.to_content(page)
+
+    def title_ranges(self) -> List[Tuple[Union[str, None], Union[str, None]]]:
+        """Split the titles from resume_from on into up to self.partitions [start, end) ranges"""
+        points = self.split_points or default_split_points(self.partitions)
+        if self.resume_from:
+            points = [v for v in points if title_key(v) > title_key(self.resume_from)]
+        points = sorted({title_key(v) for v in points})
+        return list(zip([self.resume_from, *points], [*points, None]))
+
     def find_titles(self) -> Iterable[str]:
+        if not self.site:
+            return
+        ranges = self.title_ranges()
+        print(f"API: querying allpages for namespace {self.namespace}"
+              f"{' from ' + self.resume_from if self.resume_from else ''}"
+              f"{f' in {len(ranges)} ranges' if len(ranges) > 1 else ''}")
         titles = set()
-        if self.site:
-            print(f"API: querying allpages for namespace {self.namespace}")
-            for q in self.site.query(list='allpages', apnamespace=self.namespace, aplimit='max'):
-                for p in q['allpages']:
-                    if p.title in titles or not self.title_filter(p.ns, p.title):
-                        continue
-                    titles.add(p.title)
+        if len(ranges) > 1:
+            # List all ranges at once, but return the titles in order to keep the full reload resumable
+            with ThreadPoolExecutor(len(ranges)) as executor:
+                results = ordered_map(executor, lambda start, end: list(self.list_range(start, end)),
+                                      ranges, len(ranges))
+                for range_titles in results:
+                    for title in range_titles:
+                        if title not in titles:
+                            titles.add(title)
+                            yield title
+        else:
+            for title in self.list_range(*ranges[0]):
+                if title not in titles:
+                    titles.add(title)
+                    yield title
+
+    def list_range(self, start: Union[str, None], end: Union[str, None]) -> Iterable[str]:
+        for q in self.site.query(list='allpages', apnamespace=self.namespace, aplimit='max',
+                                 apfrom=start, apto=end):
+            for p in q['allpages']:
+                # apto is inclusive, but the end title belongs to the next range
+                if end and title_key(p.title) >= end:
+                    continue
+                if self.title_filter(p.ns, p.title):
                     yield p.title
 
     def get_all_titles(self, progress_reporter: Callable[[str], None],
@@ -127,5 +239,9 @@ class WikipageDownloader(PageRetriever):
     def can_refresh(self) -> bool:
         return bool(self.site)
 
+    def after_refresh(self, filters=None):
+        if self.site:
+            print(self.site.report())
+
     def recent_changes_filter(self, rc):
         return True
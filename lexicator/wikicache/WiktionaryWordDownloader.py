@@ -1,15 +1,131 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, Dict, Iterable
+from typing import Callable, Dict, Iterable, Union, Tuple, List, Set, TYPE_CHECKING
+
+from pywikiapi import to_datetime
 
-from lexicator.consts import NS_MAIN
+from lexicator.consts import NS_MAIN, NS_TEMPLATE, NS_TEMPLATE_NAME, root_templates, re_template_names
 from .PageContent import PageContent
 from .WikipageDownloader import WikipageDownloader
-from .utils import LogConfig, MwSite
+from .utils import LogConfig, MwSite, interleave, title_key, ordered_map, batches
+
+if TYPE_CHECKING:
+    from .ContentStore import ContentStore
 
 
 class WiktionaryWordDownloader(WikipageDownloader):
-    def __init__(self, wiktionary: MwSite, log_config: LogConfig):
-        super().__init__(site=wiktionary, namespace=NS_MAIN, log_config=log_config)
+    def __init__(self, wiktionary: MwSite, log_config: LogConfig, partitions: int = 1,
+                 templates: ContentStore = None, concurrency: int = 1, delete_untargeted: bool = False):
+        super().__init__(site=wiktionary, namespace=NS_MAIN, log_config=log_config, partitions=partitions,
+                         concurrency=concurrency)
+        # With the templates store, only the pages that transclude one of the root templates are downloaded
+        self.templates = templates
+        # Also delete the stored pages that do not embed the root templates, e.g. those stored by the full crawl
+        self.delete_untargeted = delete_untargeted
+        self._root_template_titles: Union[Set[str], None] = None
+
+    def before_refresh(self, filters=None):
+        if self.templates:
+            self.templates.refresh()
+            self._root_template_titles = None
+
+    def root_template_titles(self) -> Set[str]:
+        """Titles of the root templates, and of the stored templates that match re_template_names"""
+        if self._root_template_titles is None:
+            lang_code = self.site.lang_code
+            prefix = NS_TEMPLATE_NAME[lang_code]
+            titles = {prefix + v for v in root_templates[lang_code]}
+            pattern = re_template_names[lang_code]
+            if pattern:
+                titles.update(v for v, _ in self.templates.iter_stored_titles() if pattern.search(v))
+            self._root_template_titles = titles
+        return self._root_template_titles
+
+    def find_titles(self) -> Iterable[str]:
+        if not self.templates:
+            yield from super().find_titles()
+            return
+        for title in self.embedding_titles():
+            if not self.resume_from or title_key(title) >= title_key(self.resume_from):
+                yield title
+
+    def embedding_titles(self) -> List[str]:
+        """All titles that embed any of the root templates, sorted like allpages to keep the full reload resumable"""
+        if not self.site:
+            return []
+        templates = sorted(self.root_template_titles())
+        print(f"API: querying pages in namespace {self.namespace} that embed any of {len(templates):,} templates")
+        titles = set()
+        with ThreadPoolExecutor(self.partitions) as executor:
+            for embedding in ordered_map(executor, lambda v: list(self.embedded_in(v)), ((v,) for v in templates),
+                                         self.partitions * 2):
+                titles.update(embedding)
+        return sorted(titles, key=title_key)
+
+    def embedded_in(self, template: str) -> Iterable[str]:
+        for q in self.site.query(list='embeddedin', eititle=template, einamespace=self.namespace, eilimit='max'):
+            for p in q['embeddedin']:
+                if self.title_filter(p.ns, p.title):
+                    yield p.title
+
+    def get_titles(self,
+                   source: Iterable[str],
+                   force: Union[bool, str],
+                   progress_reporter: Callable[[str], None] = None) -> Iterable[PageContent]:
+        if not self.templates or not self.site:
+            yield from super().get_titles(source, force, progress_reporter)
+            return
+        # Recently changed pages may have started or stopped using the root templates. Download the first,
+        # and skip the second, or delete them in case they have been stored before.
+        dropped = []
+
+        def candidates():
+            for batch in self.templates_controller().batches(source):
+                embedding = self.find_embedding(batch)
+                for title in batch:
+                    if title in embedding:
+                        yield title
+                    else:
+                        dropped.append(title)
+
+        yield from super().get_titles(candidates(), force, progress_reporter)
+        if dropped:
+            print(f"API: {len(dropped):,} changed pages do not embed any root templates"
+                  f"{', deleting them' if self.delete_untargeted else ''}")
+        if self.delete_untargeted:
+            for title in dropped:
+                yield PageContent(title=title)
+
+    def find_outdated(self, titles: List[str], timestamps: Dict[str, datetime]) -> Set[str]:
+        """Those of the stored titles that have been edited after their stored timestamp, without getting the content"""
+        result = set()
+        limit = 500 if self.site.use_bot_limits else 50
+        controller = self.site.batch_controller('info', limit, 10, limit)
+        for batch in controller.batches(titles):
+            with controller.measure(len(batch)):
+                for page in self.site.query_pages(prop='revisions', rvprop='timestamp', titles=batch):
+                    stored = timestamps.get(page.title)
+                    if stored and ('missing' in page or not page.get('revisions')
+                                   or to_datetime(page.revisions[0].timestamp) > stored):
+                        result.add(page.title)
+        return result
+
+    def templates_controller(self):
+        limit = 500 if self.site.use_bot_limits else 50
+        return self.site.batch_controller('templates', limit, 10, limit)
+
+    def find_embedding(self, titles: List[str]) -> Set[str]:
+        """Those of the titles that transclude any of the root templates"""
+        root = self.root_template_titles()
+        result = set()
+        with self.templates_controller().measure(len(titles)):
+            for page in self.site.query_pages(prop='templates', titles=titles, tlnamespace=NS_TEMPLATE,
+                                              tllimit='max'):
+                if any(v.title in root for v in page.get('templates', [])):
+                    result.add(page.title)
+        return result
 
     def get_all_titles(self, progress_reporter: Callable[[str], None],
                        exclude: Dict[str, datetime] = None,
@@ -17,18 +133,84 @@ class WiktionaryWordDownloader(WikipageDownloader):
         if filters and len(filters) > 0:
             raise ValueError('Filters not supported')
 
-        if len(exclude) < 100:
+        if self.templates:
+            all_titles = self.embedding_titles()
+
+            def titles():
+                # The titles from embeddedin are all candidates, no need to check them again in get_titles().
+                # Stored pages are only downloaded again if they have been edited since.
+                resume_key = title_key(self.resume_from) if self.resume_from else None
+                candidates = (v for v in all_titles if not resume_key or title_key(v) >= resume_key)
+                for batch in batches(candidates, 500):
+                    stored = {v for v in batch if exclude and v in exclude}
+                    outdated = self.find_outdated(sorted(stored), exclude) if stored else set()
+                    for title in batch:
+                        if title not in stored or title in outdated:
+                            yield title
+
+            yield from super().get_titles(titles(), force=False, progress_reporter=progress_reporter)
+            # Delete the stored pages that no longer embed the root templates, or were stored before the targeted mode.
+            # An empty embeddedin result is more likely an error than a wiki without the root templates.
+            if self.delete_untargeted and exclude and all_titles:
+                embedding = set(all_titles)
+                dropped = sorted((v for v in exclude if v not in embedding), key=title_key)
+                if dropped:
+                    print(f"API: deleting {len(dropped):,} stored pages that do not embed any root templates")
+                for title in dropped:
+                    yield PageContent(title=title)
+        elif len(exclude) < 100:
             if self.site:
-                print(f"API: query all content from allpages generator from namespace {self.namespace}")
-                pages_with_content = dict(**self.download_titles_query,
-                                          generator='allpages',
-                                          gapnamespace=self.namespace,
-                                          gaplimit=200 if self.site.use_bot_limits else 50,
-                                          gapfilterredir='nonredirects')
-                for page in self.site.query_pages(**pages_with_content):
-                    val = self.to_content(page)
-                    if val.title and (not exclude or (val.title not in exclude or exclude[val.title] < val.timestamp)):
-                        yield val
-                    progress_reporter(val.title)
+                ranges = self.title_ranges()
+                print(f"API: query all content from allpages generator from namespace {self.namespace}"
+                      f"{' from ' + self.resume_from if self.resume_from else ''}"
+                      f"{f' in {len(ranges)} ranges' if len(ranges) > 1 else ''}")
+                sources = [self.range_content(start, end) for start, end in ranges]
+                if len(sources) > 1:
+                    results = interleave(sources, len(sources) * 2)
+                else:
+                    results = ((0, v) for v in sources[0])
+                # All pages before the position of the first unfinished range have been returned
+                positions = [start for start, _ in ranges]
+                finished = [False] * len(ranges)
+                for index, (pages, position, done) in results:
+                    for val in pages:
+                        if not exclude or (val.title not in exclude or exclude[val.title] < val.timestamp):
+                            yield val
+                        progress_reporter(val.title)
+                    finished[index] = done
+                    if position:
+                        positions[index] = position
+                    self.checkpoint = next((v for v, f in zip(positions, finished) if not f), None)
         else:
             yield from super().get_all_titles(progress_reporter, exclude, filters)
+
+    def range_content(self, start: Union[str, None], end: Union[str, None]) \
+            -> Iterable[Tuple[List[PageContent], Union[str, None], bool]]:
+        """
+        Yield the pages of each response for the [start, end) titles range, together with the title
+        the range could be resumed from (None if it has not moved), and whether the range is done"""
+        pages_with_content = dict(**self.download_titles_query,
+                                  generator='allpages',
+                                  gapnamespace=self.namespace,
+                                  gaplimit=self.content_controller().size,
+                                  gapfilterredir='nonredirects',
+                                  gapfrom=start,
+                                  gapto=end)
+        # Continue manually rather than with query_pages() to know when a generator batch is complete.
+        # Pages whose content did not fit into the response come again with rvcontinue.
+        continuation = {'continue': ''}
+        while continuation:
+            result = self.site('query', **pages_with_content, **continuation)
+            pages = []
+            for page in result.get('query', {}).get('pages', []):
+                # gapto is inclusive, but the end title belongs to the next range
+                if 'revisions' not in page or (end and title_key(page.title) >= end):
+                    continue
+                val = self.to_content(page)
+                if val:
+                    pages.append(val)
+            continuation = result.get('continue')
+            if continuation and 'rvcontinue' not in continuation:
+                yield pages, continuation.get('gapcontinue'), False
+            else:
+                yield pages, None, not continuation
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Dict, TYPE_CHECKING, IO, Union
+
+from pywikiapi import AttrDict, to_datetime
+
+from .PageContent import PageContent
+from .utils import batches, trim_timedelta
+
+if TYPE_CHECKING:
+    from .ContentStore import ContentStore
+
+
+def open_dump(filename: Path) -> IO[bytes]:
+    if filename.suffix == '.bz2':
+        return bz2.open(filename, 'rb')
+    if filename.suffix == '.gz':
+        return gzip.open(filename, 'rb')
+    return filename.open('rb')
+
+
+def local_name(tag: str) -> str:
+    # Strip the export schema namespace, e.g. {http://www.mediawiki.org/xml/export-0.10/}page
+    return tag.rsplit('}', 1)[-1]
+
+
+def page_element_to_api(element: ElementTree.Element) -> AttrDict:
+    """Convert a <page> element into the same shape the MW API returns for prop=revisions|info"""
+    page = AttrDict()
+    revision = None
+    for child in element:
+        tag = local_name(child.tag)
+        if tag == 'title':
+            page.title = child.text
+        elif tag == 'ns':
+            page.ns = int(child.text)
+        elif tag == 'redirect':
+            page.redirect = child.get('title')
+        elif tag == 'revision':
+            revision = child
+    if revision is not None:
+        rev = AttrDict(slots=AttrDict(main=AttrDict(content='')))
+        for child in revision:
+            tag = local_name(child.tag)
+            if tag == 'id':
+                rev.revid = int(child.text)
+            elif tag == 'timestamp':
+                rev.timestamp = child.text
+            elif tag == 'contributor':
+                for contributor in child:
+                    if local_name(contributor.tag) in ('username', 'ip'):
+                        rev.user = contributor.text
+            elif tag == 'text':
+                rev.slots.main.content = child.text or ''
+        page.revisions = [rev]
+    else:
+        page.revisions = []
+    return page
+
+
+class XmlDumpReader:
+    """
+    Stream pages from a local MediaWiki XML export, such as ruwiktionary-latest-pages-articles.xml.bz2.
+    Each page is returned in the shape of an API query result, so that the downloaders can convert it
+    with their own to_content(). Elements are discarded as soon as they are parsed to keep memory bounded.
+    Pages with more than one revision (full history dumps) only keep the last one."""
+
+    def __init__(self, filename: Path) -> None:
+        self.filename = filename
+        self.max_timestamp: datetime = None
+
+    def __iter__(self) -> Iterable[AttrDict]:
+        with open_dump(self.filename) as file:
+            yield from self.parse(file)
+
+    def parse(self, file: IO[bytes]) -> Iterable[AttrDict]:
+        root = None
+        for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+            if root is None:
+                root = element
+            if event != 'end' or local_name(element.tag) != 'page':
+                continue
+            page = page_element_to_api(element)
+            root.clear()
+            yield self.track_timestamp(page)
+
+    def track_timestamp(self, page: AttrDict) -> AttrDict:
+        if page.revisions:
+            ts = to_datetime(page.revisions[0].timestamp)
+            if not self.max_timestamp or ts > self.max_timestamp:
+                self.max_timestamp = ts
+        return page
+
+
+def import_xml_dump(reader: Union[Path, XmlDumpReader], stores: List[ContentStore], batch_size: int = 500) -> None:
+    """
+    Bulk-load the pages of an XML dump into the stores whose downloaders handle that page's namespace.
+    Afterwards, each store's last change is set to the newest revision in the dump,
+    so that the next refresh() only catches up with the recent changes."""
+    if not isinstance(reader, XmlDumpReader):
+        reader = XmlDumpReader(reader)
+    by_namespace: Dict[int, ContentStore] = {}
+    for store in stores:
+        namespace = getattr(store.retriever, 'namespace', None)
+        if namespace is None or not hasattr(store.retriever, 'dump_page_to_content'):
+            raise ValueError(f"Store {store.filename} cannot be loaded from a page dump")
+        by_namespace[namespace] = store
+
+    start_ts = datetime.utcnow()
+    pending: Dict[int, List[AttrDict]] = {ns: [] for ns in by_namespace}
+    counts = {ns: 0 for ns in by_namespace}
+    processed = 0
+
+    def pages_for(namespace: int) -> Iterable[PageContent]:
+        retriever = by_namespace[namespace].retriever
+        for page in pending[namespace]:
+            content = retriever.dump_page_to_content(page)
+            if content:
+                counts[namespace] += 1
+                yield content
+
+    for batch in batches(reader, batch_size):
+        for page in batch:
+            processed += 1
+            if page.ns in pending:
+                pending[page.ns].append(page)
+        for ns, pages in pending.items():
+            if len(pages) >= batch_size:
+                by_namespace[ns].save_pages(pages_for(ns))
+                pages.clear()
+        if processed % (batch_size * 100) < batch_size:
+            print(f"Read {processed:,} pages from {reader.filename} in {trim_timedelta(datetime.utcnow() - start_ts)}, "
+                  f"current page is '{batch[-1].title}'")
+    for ns, pages in pending.items():
+        if pages:
+            by_namespace[ns].save_pages(pages_for(ns))
+
+    if reader.max_timestamp:
+        for store in by_namespace.values():
+            store.set_last_change(reader.max_timestamp)
+    for ns, store in by_namespace.items():
+        print(f"Imported {counts[ns]:,} pages into {store.filename}, last change is {reader.max_timestamp}")
@@ -1,8 +1,14 @@
+from .BatchController import BatchController
+from .Cassette import Cassette
 from .ContentStore import ContentStore
+from .DumpPageRetriever import DumpPageRetriever
 from .LexemeDownloader import LexemeDownloader
+from .LexemeDumpReader import LexemeDumpReader, import_lexeme_dump
+from .MultistreamDumpReader import MultistreamDumpReader
 from .PageFilter import PageFilter
 from .ResolverViaMwParse import ResolverViaMwParse
 from .TemplateDownloader import TemplateDownloader
 from .WikidataQueryService import WikidataQueryService
 from .WiktionaryWordDownloader import WiktionaryWordDownloader
+from .XmlDumpReader import XmlDumpReader, import_xml_dump
 from .utils import to_json, json_key, LogConfig, MwSite
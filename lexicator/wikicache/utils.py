@@ -1,10 +1,19 @@
 import dataclasses
 import json
+import time
+from collections import deque
+from concurrent.futures import Executor
+from contextlib import nullcontext
 from datetime import timedelta
-from typing import Iterable, List, TypeVar
+from queue import Queue, Full
+from threading import Lock, local, Thread, Event, BoundedSemaphore
+from typing import Iterable, List, TypeVar, Tuple, Optional, Any, Callable, Dict
 
 from pywikiapi import Site
 
+from .BatchController import BatchController
+from .Cassette import Cassette
+
 T = TypeVar('T')
 
 
@@ -23,6 +32,102 @@ def batches(items: Iterable[T], batch_size: int) -> Iterable[List[T]]:
         yield res
 
 
+def ordered_map(executor: Executor, func: Callable[..., T], items: Iterable, max_in_flight: int) -> Iterable[T]:
+    """Like executor.map(), but only keeps max_in_flight items submitted, so that a long input is consumed lazily.
+    Results are returned in the order of the input. Each item is passed to func as positional arguments."""
+    pending = deque()
+    items = iter(items)
+    while True:
+        while len(pending) < max_in_flight:
+            item = next(items, None)
+            if item is None:
+                break
+            pending.append(executor.submit(func, *item))
+        if not pending:
+            break
+        yield pending.popleft().result()
+
+
+def prefetch(items: Iterable[T], depth: int) -> Iterable[T]:
+    """Iterate over items in a background thread, keeping at most depth values ready ahead of the consumer.
+    Exceptions of the producer are re-raised in the consumer, and closing the result stops the producer."""
+    for _, item in interleave([items], depth):
+        yield item
+
+
+def interleave(sources: List[Iterable[T]], depth: int) -> Iterable[Tuple[int, T]]:
+    """Iterate over several sources at once, each in its own background thread, and yield (source index, value)
+    in the order the values become ready, keeping at most depth values ready ahead of the consumer.
+    Exceptions of the producers are re-raised in the consumer, and closing the result stops the producers."""
+    queue = Queue(depth)
+    stop = Event()
+    done = object()
+
+    def put(value) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(value, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce(index: int, items: Iterable[T]):
+        try:
+            for item in items:
+                if not put((index, item, None)):
+                    return
+            put((index, done, None))
+        except BaseException as err:
+            put((index, done, err))
+
+    threads = [Thread(target=produce, args=(idx, items), name='prefetch', daemon=True)
+               for idx, items in enumerate(sources)]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            index, item, err = queue.get()
+            if item is done:
+                if err:
+                    raise err
+                remaining -= 1
+            else:
+                yield index, item
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+
+
+def outer_join_sorted(left: Iterable[Tuple[str, Any]], right: Iterable[Tuple[str, Any]]) \
+        -> Iterable[Tuple[str, Optional[Tuple[str, Any]], Optional[Tuple[str, Any]]]]:
+    """Full outer join of two (key, value) streams, both sorted by key, with unique keys.
+    Yields (key, left_row, right_row), where a missing row is None."""
+    left, right = iter(left), iter(right)
+    left_row, right_row = next(left, None), next(right, None)
+    while left_row is not None or right_row is not None:
+        if right_row is None or (left_row is not None and left_row[0] < right_row[0]):
+            yield left_row[0], left_row, None
+            left_row = next(left, None)
+        elif left_row is None or right_row[0] < left_row[0]:
+            yield right_row[0], None, right_row
+            right_row = next(right, None)
+        else:
+            yield left_row[0], left_row, right_row
+            left_row, right_row = next(left, None), next(right, None)
+
+
+def unique_sorted(items: Iterable[T]) -> Iterable[T]:
+    """Skip the repeated values of a sorted stream"""
+    last = object()
+    for value in items:
+        if value != last:
+            yield value
+        last = value
+
+
 def trim_timedelta(td: timedelta) -> str:
     return str(td + timedelta(seconds=1)).split('.', 1)[0]
 
@@ -40,6 +145,11 @@ def to_json(obj, pretty=False):
         return to_compact_json(obj)
 
 
+def title_key(title: str) -> str:
+    """MediaWiki sorts and splits title ranges by the database key, which has underscores instead of spaces"""
+    return title.replace(' ', '_')
+
+
 def json_key(template, params):
     return json.dumps({template: params}, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
 
@@ -51,11 +161,66 @@ class LogConfig:
 
 
 class MwSite(Site):
-    def __init__(self, url, lang_code: str, *args, **kwargs):
+    def __init__(self, url, lang_code: str, *args, max_parallel: int = 0, cassette: Cassette = None, **kwargs):
         super().__init__(url, *args, **kwargs)
         self.lang_code = lang_code
+        # The cassette the session records to or replays from, it also keeps the batch sizes of the controllers
+        self.cassette = cassette
+        # Global limit of concurrent requests to this site, shared by all downloader threads, 0 is unlimited
+        self.request_slots = BoundedSemaphore(max_parallel) if max_parallel else None
         self._use_bot_limits = None
+        # When the server reports maxlag, all threads sharing this site pause, not just the one that got the error
+        self.lag_lock = Lock()
+        self.paused_until = 0.0
+        # Pause before each request, raised on maxlag and errors, and decayed back to zero on success
+        self.delay = 0.0
+        self.max_delay = 10.0
+        self.controllers: Dict[str, BatchController] = {}
+        # Response bytes and maxlag errors of the current thread, used by BatchController.measure()
+        self.counters = local()
 
     @property
     def use_bot_limits(self) -> bool:
         return self.is_bot()
+
+    def batch_controller(self, name: str, size: int, minimum: int, maximum: int, **kwargs) -> BatchController:
+        with self.lag_lock:
+            if name not in self.controllers:
+                self.controllers[name] = BatchController(self, name, size, minimum, maximum, **kwargs)
+            return self.controllers[name]
+
+    def thread_counters(self) -> Tuple[int, int]:
+        return getattr(self.counters, 'payload', 0), getattr(self.counters, 'lagged', 0)
+
+    def request(self, method, timeout, **request_kw):
+        delay = max(self.paused_until - time.monotonic(), self.delay)
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            with self.request_slots or nullcontext():
+                response = super().request(method, timeout, **request_kw)
+        except Exception:
+            self.slow_down()
+            raise
+        self.counters.payload = getattr(self.counters, 'payload', 0) + len(response.content)
+        if response.headers.get('MediaWiki-API-Error') == 'maxlag':
+            self.counters.lagged = getattr(self.counters, 'lagged', 0) + 1
+            self.pause(float(response.headers.get('Retry-After', 5)))
+            self.slow_down()
+        elif self.delay:
+            with self.lag_lock:
+                self.delay = self.delay * 0.8 if self.delay > 0.05 else 0.0
+        return response
+
+    def pause(self, seconds: float) -> None:
+        with self.lag_lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def slow_down(self) -> None:
+        with self.lag_lock:
+            self.delay = min(self.max_delay, max(0.25, self.delay * 2))
+
+    def report(self) -> str:
+        """Current pacing and batch sizes, one line per kind of request"""
+        return '\n'.join([f"{self.url}: delay between requests {self.delay:.2f}s",
+                          *(f"  {v}" for v in self.controllers.values())])
@@ -0,0 +1,59 @@
+import dataclasses
+from datetime import datetime
+from typing import Dict, Iterable
+
+from lexicator.wikicache.PageContent import PageContent
+from lexicator.wikicache.PageFilter import PageFilter
+from lexicator.wikicache.PageRetriever import PageRetriever
+from lexicator.wikicache.utils import title_key
+
+
+class MemoryRetriever(PageRetriever):
+    """Serves the pages of a dict as if they were on the wiki, and records which titles were requested"""
+
+    def __init__(self, pages: Iterable[PageContent] = ()) -> None:
+        super().__init__()
+        self.pages: Dict[str, PageContent] = {v.title: v for v in pages}
+        # Deleted titles with the time of the deletion
+        self.deleted: Dict[str, datetime] = {}
+        self.requested = []
+
+    def edit(self, *pages: PageContent) -> None:
+        self.pages.update((v.title, v) for v in pages)
+
+    def delete(self, title: str, timestamp: datetime) -> None:
+        del self.pages[title]
+        self.deleted[title] = timestamp
+
+    def find_recent_changes(self, last_change: datetime):
+        changes = [*((v.title, v.timestamp) for v in self.pages.values()), *self.deleted.items()]
+        return sorted(v for v in changes if v[1] > last_change)
+
+    def get_titles(self, source, force, progress_reporter=None):
+        for title in source:
+            self.requested.append(title)
+            yield self.pages.get(title) or PageContent(title=title)
+
+    def get_all_titles(self, progress_reporter, exclude=None, filters=None):
+        for title in sorted(self.pages, key=title_key):
+            if self.resume_from and title_key(title) < title_key(self.resume_from):
+                continue
+            # All the pages before this one have been returned
+            self.checkpoint = title
+            self.requested.append(title)
+            yield self.pages[title]
+
+    def can_refresh(self) -> bool:
+        return True
+
+
+class UpperFilter(PageFilter):
+    """Generates each page from the same page of the source store, and records which pages were processed"""
+
+    def __init__(self, source) -> None:
+        super().__init__(source=source)
+        self.processed = []
+
+    def process_page(self, page: PageContent, force) -> PageContent:
+        self.processed.append(page.title)
+        return dataclasses.replace(page, content=page.content.upper())
@@ -0,0 +1,24 @@
+from benchmarks.common import synthetic_title
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from lexicator.wikicache import Cassette
+from lexicator.wikicache.WikipageDownloader import WikipageDownloader
+
+
+def download(site, titles):
+    return [(v.title, v.revid, v.content) for v in WikipageDownloader(site, 0, concurrency=4).get_titles(titles, False)]
+
+
+def test_record_replay(tmp_path):
+    titles = [synthetic_title(idx) for idx in range(4000)]
+    # Retried requests and the batch sizes adapted while recording must come back the same when replayed
+    api = FakeApi(FakeCorpus.synthetic(4000), latency=0.005, maxlag_rate=0.3, retry_after=0.01).start()
+    cassette = Cassette(tmp_path / 'test.cassette', 'record')
+    recorded = download(api.site(session=cassette.session(), cassette=cassette), titles)
+    api.shutdown()
+    assert api.maxlag_count > 0
+    assert [v[0] for v in recorded] == titles
+
+    cassette = Cassette(tmp_path / 'test.cassette', 'replay', latency=0.02)
+    replayed = download(api.site(session=cassette.session(), cassette=cassette), titles)
+    assert replayed == recorded
+    assert cassette.replayed == api.request_count
@@ -0,0 +1,155 @@
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from benchmarks.common import NullRetriever
+from lexicator.wikicache import ContentStore
+from lexicator.wikicache.ContentStore import count_progress
+from lexicator.wikicache.PageContent import PageContent
+from tests.retrievers import MemoryRetriever, UpperFilter
+
+
+def test_reader_cache_size(tmp_path):
+    store = ContentStore(tmp_path / 'store.db', NullRetriever(), pragmas='bulk-load')
+    assert store.engine.execute('PRAGMA cache_size').scalar() == -512 * 1024
+    with store.read_session() as reader:
+        assert reader.execute('PRAGMA cache_size').scalar() == -2000
+
+
+def test_count_progress_from_threads():
+    progress = {'saved': 0, 'unchanged': 0}
+    with ThreadPoolExecutor(8) as executor:
+        for _ in executor.map(lambda _: [count_progress(progress, 'unchanged') for _ in range(10000)], range(8)):
+            pass
+    assert progress == {'saved': 0, 'unchanged': 80000}
+
+
+@pytest.fixture
+def derived(tmp_path):
+    """A source store with three pages, and a store generated from it"""
+    source = ContentStore(tmp_path / 'source.db', MemoryRetriever(
+        PageContent(title=v, timestamp=datetime(2020, 1, 1), revid=idx, content=v) for idx, v in enumerate('abc')))
+    source.refresh()
+    return source, ContentStore(tmp_path / 'derived.db', UpperFilter(source))
+
+
+def test_find_stale_titles(derived):
+    source, store = derived
+    assert list(store.find_stale_titles()) == ['a', 'b', 'c']
+    store.refresh()
+    assert list(store.find_stale_titles()) == []
+    assert store.retriever.processed == ['a', 'b', 'c']
+
+    source.save_pages([PageContent(title='b', timestamp=datetime(2020, 2, 1), revid=5, content='b2'),
+                       PageContent(title='d', timestamp=datetime(2020, 1, 15), revid=6, content='d')])
+    source.delete_pages(['c'])
+    assert list(store.find_stale_titles()) == ['b', 'd']
+    assert list(store.find_stale_titles(since=datetime(2020, 1, 20))) == ['b']
+    assert list(store.find_orphaned_titles()) == ['c']
+
+
+def test_delete_orphans_on_full_reload(derived):
+    source, store = derived
+    store.refresh()
+    source.delete_pages(['c'])
+    source.save_pages([PageContent(title='b', timestamp=datetime(2020, 2, 1), revid=5, content='b2')])
+    store.set_info(timestamp=None)
+    store.retriever.processed.clear()
+    store.refresh()
+    # Only the changed page is generated again
+    assert store.retriever.processed == ['b']
+    assert [(v.title, v.content) for v in store.get_all(order_by=store.PageContentDb.title)] == \
+           [('a', 'A'), ('b', 'B2')]
+
+
+def test_changed_since(derived):
+    source, store = derived
+    source.retriever.edit(PageContent(title='b', timestamp=datetime(2020, 3, 1), revid=5, content='b2'),
+                          PageContent(title='d', timestamp=datetime(2020, 2, 1), revid=6, content='d'))
+    # Refreshes the source store first
+    assert list(store.retriever.find_recent_changes(datetime(2020, 2, 15))) == [('b', datetime(2020, 3, 1))]
+    # Oldest first, with only the requested columns
+    assert list(source.changed_since(datetime(2020, 1, 1))) == \
+           [('d', datetime(2020, 2, 1)), ('b', datetime(2020, 3, 1))]
+    assert list(source.changed_since(datetime(2020, 2, 1), columns=('title', 'revid', 'content'))) == [('b', 5, 'b2')]
+
+
+class FailingRetriever(MemoryRetriever):
+    """Fails after returning the given number of pages of a full reload"""
+
+    def __init__(self, pages, fail_after: int) -> None:
+        super().__init__(pages)
+        self.fail_after = fail_after
+
+    def get_all_titles(self, progress_reporter, exclude=None, filters=None):
+        for idx, page in enumerate(super().get_all_titles(progress_reporter, exclude, filters)):
+            if idx == self.fail_after:
+                raise ValueError('Connection lost')
+            yield page
+
+
+def many_pages(count: int):
+    return [PageContent(title=f'p{idx:05}', timestamp=datetime(2020, 1, 1), revid=idx, content=str(idx))
+            for idx in range(count)]
+
+
+@pytest.mark.parametrize('pipeline', [0, 2])
+def test_pipelined_refresh(tmp_path, pipeline):
+    store = ContentStore(tmp_path / 'store.db', MemoryRetriever(many_pages(2200)), pipeline=pipeline)
+    assert len(store.refresh()) == 2200
+    assert [(v.title, v.content) for v in store.get_all(order_by=store.PageContentDb.title)] == \
+           [(v.title, v.content) for v in many_pages(2200)]
+
+
+@pytest.mark.parametrize('pipeline', [0, 2])
+def test_pipelined_refresh_error(tmp_path, pipeline):
+    store = ContentStore(tmp_path / 'store.db', FailingRetriever(many_pages(2200), 1200), pipeline=pipeline)
+    with pytest.raises(ValueError, match='Connection lost'):
+        store.refresh()
+    # The batches saved before the error are kept, and the checkpoint is not ahead of them even when
+    # the prefetching thread has already fetched the following pages
+    assert len(list(store.iter_stored_titles())) == 1000
+    assert store.get_continuation() == 'refresh:p00999'
+
+
+class TemplateFilter(UpperFilter):
+    """Each page depends on the templates named in its content"""
+
+    def process_page(self, page: PageContent, force) -> PageContent:
+        return dataclasses.replace(super().process_page(page, force), dependencies=page.content.split())
+
+
+def test_mark_stale(tmp_path):
+    created = datetime(2020, 1, 1)
+    templates = ContentStore(tmp_path / 'templates.db', MemoryRetriever(
+        PageContent(title=v, timestamp=datetime(2019, 6, 1) if v == 'T2' else created, revid=idx, content=v)
+        for idx, v in enumerate(['T1', 'T2', 'T3'])))
+    templates.refresh()
+    words = ContentStore(tmp_path / 'words.db', MemoryRetriever([
+        PageContent(title='a', timestamp=created, revid=1, content='T1 T2'),
+        PageContent(title='b', timestamp=created, revid=2, content='T2'),
+        PageContent(title='c', timestamp=created, revid=3, content='T3')]))
+    words.refresh()
+    parsed = ContentStore(tmp_path / 'parsed.db', TemplateFilter(words), depends_on=templates)
+    parsed.refresh()
+    assert templates.dependents == [parsed]
+
+    assert parsed.mark_stale(['T2']) == 2
+    assert parsed.find_marked_titles() == ['a', 'b']
+    # The marked pages are generated again although their source has not changed, and the marks are cleared
+    parsed.retriever.processed.clear()
+    parsed.refresh()
+    assert parsed.retriever.processed == ['a', 'b']
+    assert parsed.find_marked_titles() == []
+
+    # Changing or deleting a template in the refresh of its store marks the pages that use it
+    templates.retriever.edit(PageContent(title='T1', timestamp=datetime(2020, 2, 1), revid=5, content='new'))
+    templates.retriever.delete('T3', datetime(2020, 2, 1))
+    templates.refresh()
+    assert parsed.find_marked_titles() == ['a', 'c']
+
+    # Deleted pages lose their dependencies
+    parsed.delete_pages(['c'])
+    assert parsed.mark_stale(['T3']) == 0
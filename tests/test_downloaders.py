@@ -0,0 +1,105 @@
+import pytest
+
+from benchmarks.common import synthetic_title
+from benchmarks.fake_api import FakeApi, FakeCorpus
+from lexicator.wikicache import ContentStore, LogConfig, TemplateDownloader, WiktionaryWordDownloader
+from lexicator.wikicache.WikipageDownloader import WikipageDownloader
+from lexicator.wikicache.utils import title_key
+
+
+@pytest.fixture(scope='module')
+def api():
+    return FakeApi(FakeCorpus.synthetic(2000), latency=0.01).start()
+
+
+def test_concurrent_order(api):
+    # Missing titles are interleaved to check that they keep their place too
+    titles = [synthetic_title(idx) if idx % 7 else f'missing{idx}' for idx in range(2000)][::-1]
+    site = api.site()
+    downloader = WikipageDownloader(site, 0, concurrency=4)
+    pages = list(downloader.get_titles(titles, force=False))
+    assert [v.title for v in pages] == titles
+    assert [v.is_deleted() for v in pages] == [not v.startswith('слово') for v in titles]
+    assert downloader.checkpoint == titles[-1]
+
+
+@pytest.fixture
+def crawled(tmp_path):
+    """A words store filled by the full crawl, before switching it to the targeted mode"""
+    corpus = FakeCorpus.synthetic(300, 5)
+    for idx in range(200):
+        corpus.add_page(0, f'word{idx:05}', '== English ==\n{{en-noun}}\n')
+    api = FakeApi(corpus).start()
+    words = ContentStore(tmp_path / 'words.db', WiktionaryWordDownloader(api.site(), LogConfig(), partitions=4))
+    words.refresh()
+    assert len(list(words.iter_stored_titles())) == 500
+    corpus.edit(synthetic_title(7), '= {{-ru-}} =\n{{сущ-ru|новое|м 1a}}')
+    yield api, tmp_path
+    api.shutdown()
+
+
+@pytest.mark.parametrize('delete_untargeted', [False, True])
+def test_targeted_reload(crawled, delete_untargeted):
+    api, tmp_path = crawled
+    templates = ContentStore(tmp_path / 'templates.db', TemplateDownloader(api.site(), log_config=LogConfig()))
+    downloader = WiktionaryWordDownloader(api.site(), LogConfig(), partitions=4, templates=templates,
+                                          delete_untargeted=delete_untargeted)
+    words = ContentStore(tmp_path / 'words.db', downloader)
+    words.set_info(timestamp=None, continuation=None)
+    # Only the edited page is downloaded again
+    assert set(words.refresh()) == {synthetic_title(7)}
+    assert words.get(synthetic_title(7)).content == '= {{-ru-}} =\n{{сущ-ru|новое|м 1a}}'
+    titles = [v for v, _ in words.iter_stored_titles()]
+    assert len(titles) == (300 if delete_untargeted else 500)
+
+
+@pytest.mark.parametrize('check_revisions', [False, True])
+def test_check_revisions(tmp_path, check_revisions):
+    corpus = FakeCorpus.synthetic(100)
+    api = FakeApi(corpus).start()
+    words = ContentStore(tmp_path / 'words.db', WiktionaryWordDownloader(api.site(), LogConfig()),
+                         check_revisions=check_revisions)
+    words.refresh()
+    edited, touched, created = synthetic_title(1), synthetic_title(2), 'новое'
+    corpus.edit(edited, '= {{-ru-}} =\n{{сущ-ru|новое|м 1a}}')
+    # A recent change that did not create a revision, e.g. a log entry
+    corpus.recent_changes.append(dict(type='log', ns=0, title=touched, timestamp=corpus.pages[edited].timestamp))
+    corpus.add_page(0, created, '= {{-ru-}} =\n', timestamp=corpus.pages[edited].timestamp)
+    corpus.recent_changes.append(dict(type='new', ns=0, title=created, timestamp=corpus.pages[edited].timestamp))
+    titles = set(words.refresh())
+    api.shutdown()
+    assert titles == ({edited, created} if check_revisions else {edited, touched, created})
+    assert words.get(edited).revid == corpus.pages[edited].revid
+
+
+def test_resume_partitioned_reload(tmp_path):
+    corpus = FakeCorpus()
+    for letter in 'абвгдежзиклмнопрстуфхцчшэюя':
+        for idx in range(40):
+            corpus.add_page(0, f'{letter}{idx:03}', '= {{-ru-}} =\n')
+    api = FakeApi(corpus).start()
+    words = ContentStore(tmp_path / 'words.db', WiktionaryWordDownloader(api.site(), LogConfig(), partitions=4))
+    save_pages, saved = words.save_pages, []
+
+    def interrupted(pages, progress=None):
+        if len(saved) == 2:
+            raise KeyboardInterrupt()
+        saved.append(len(pages))
+        return save_pages(pages, progress)
+
+    words.save_pages = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        words.refresh()
+    continuation = words.get_continuation()
+    assert continuation.startswith('refresh:')
+    checkpoint = continuation[len('refresh:'):]
+    stored = {v for v, _ in words.iter_stored_titles()}
+    # Everything before the checkpoint has been saved, even though the ranges were crawled at once
+    assert all(v in stored for v in corpus.titles(0) if title_key(v) < title_key(checkpoint))
+
+    words = ContentStore(tmp_path / 'words.db', WiktionaryWordDownloader(api.site(), LogConfig(), partitions=4))
+    titles = words.refresh()
+    api.shutdown()
+    assert all(title_key(v) >= title_key(checkpoint) for v in titles)
+    assert [v for v, _ in words.iter_stored_titles()] == corpus.titles(0)
+    assert words.get_continuation() is None
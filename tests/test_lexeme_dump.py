@@ -0,0 +1,46 @@
+import json
+
+from pywikiapi import AttrDict
+
+from lexicator.consts import Q_LANGUAGE_CODES
+from lexicator.wikicache import LexemeDownloader, LexemeDumpReader, LogConfig
+
+q_ru = Q_LANGUAGE_CODES['ru']
+revision = dict(
+    type='lexeme', id='L7', lemmas=dict(ru=dict(language='ru', value='кот')), lexicalCategory='Q1084',
+    language=q_ru, claims={}, nextFormId=3, nextSenseId=2,
+    forms=[dict(id='L7-F1', representations={}, grammaticalFeatures=[], claims={}),
+           dict(id='L7-F2', representations={}, grammaticalFeatures=[], claims={})],
+    senses=[dict(id='L7-S1', glosses={}, claims={})])
+
+
+def dump_entity(**kwargs):
+    """The same lexeme as it appears in the JSON dump: with page metadata, without the form and sense counters"""
+    entity = dict(pageid=123, ns=146, title='Lexeme:L7', lastrevid=1001, modified='2020-02-01T10:00:00Z')
+    entity.update((k, v) for k, v in revision.items() if k not in ('nextFormId', 'nextSenseId'))
+    entity.update(kwargs)
+    return entity
+
+
+def test_same_as_api(tmp_path):
+    downloader = LexemeDownloader(None, None, 'ru', LogConfig())
+    api_page = AttrDict(title='Lexeme:L7', ns=146, revisions=[AttrDict(
+        revid=1001, timestamp='2020-02-01T10:00:00Z', user='Кто-то',
+        slots=AttrDict(main=AttrDict(content=json.dumps(revision, ensure_ascii=False))))])
+    expected = downloader.to_content(api_page)
+
+    page = LexemeDumpReader(downloader, tmp_path / 'dump.json').entity_to_content(dump_entity())
+    assert page.content == expected.content
+    assert (page.title, page.ns, page.revid, page.timestamp, page.data) == \
+           (expected.title, expected.ns, expected.revid, expected.timestamp, expected.data)
+
+
+def test_skip_broken_entities(tmp_path):
+    filename = tmp_path / 'dump.json'
+    broken = dump_entity(id='L8')
+    del broken['modified']
+    entities = [broken, dump_entity(id='L9', language='Q1860'), dump_entity()]
+    filename.write_text('[\n' + ',\n'.join(json.dumps(v, ensure_ascii=False) for v in entities) + '\n]\n',
+                        encoding='utf-8')
+    reader = LexemeDumpReader(LexemeDownloader(None, None, 'ru', LogConfig()), filename)
+    assert [page.title for _, page in reader.read()] == ['Lexeme:L7']
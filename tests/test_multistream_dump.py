@@ -0,0 +1,44 @@
+import bz2
+import re
+from pathlib import Path
+
+import pytest
+
+from lexicator.wikicache import MultistreamDumpReader
+
+fixture = Path(__file__).parent / 'fixtures' / 'pages-articles.xml.bz2'
+
+
+@pytest.fixture
+def reader(tmp_path):
+    """Split the fixture dump into a multistream dump with two pages per stream, and write its index"""
+    xml = bz2.decompress(fixture.read_bytes()).decode('utf-8')
+    pages = re.findall(r'  <page>.*?</page>\n', xml, re.DOTALL)
+    header, footer = xml[:xml.index('  <page>')], '</mediawiki>\n'
+    dump, index = bz2.compress(header.encode('utf-8')), []
+    for idx in range(0, len(pages), 2):
+        for page in pages[idx:idx + 2]:
+            index.append(f"{len(dump)}:{100 + len(index)}:{re.search('<title>(.*)</title>', page).group(1)}\n")
+        dump += bz2.compress(''.join(pages[idx:idx + 2]).encode('utf-8'))
+    dump += bz2.compress(footer.encode('utf-8'))
+    (tmp_path / 'dump.xml.bz2').write_bytes(dump)
+    (tmp_path / 'index.txt.bz2').write_bytes(bz2.compress(''.join(index).encode('utf-8')))
+    result = MultistreamDumpReader(tmp_path / 'dump.xml.bz2', tmp_path / 'index.txt.bz2', processes=2)
+    yield result
+    result.close()
+
+
+def test_iterate(reader):
+    titles = [v.title for v in reader]
+    assert titles == ['слово', 'кот', 'Слово', 'Шаблон:сущ-ru', 'Шаблон:сущ ru', 'Категория:Существительные']
+    assert reader.max_timestamp.replace(tzinfo=None).isoformat() == '2020-04-01T00:00:00'
+
+
+def test_get_pages(reader):
+    pages = reader.get_pages({'кот', 'Шаблон:сущ ru', 'нет такого'})
+    assert sorted(pages) == ['Шаблон:сущ ru', 'кот']
+    assert pages['кот'].revisions[0].revid == 1003
+    # The index is parsed once and the process pool is reused by the following calls
+    executor = reader.executor
+    assert list(reader.get_pages({'слово'})) == ['слово']
+    assert reader.executor is executor
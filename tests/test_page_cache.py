@@ -0,0 +1,60 @@
+from threading import Thread
+
+from lexicator.wikicache.PageCache import PageCache
+from lexicator.wikicache.PageContent import PageContent
+
+
+def make_page(title: str, content: str = 'абв', data=None) -> PageContent:
+    return PageContent(title=title, content=content, data=data)
+
+
+def test_encoded_size():
+    cache = PageCache(1000)
+    cache.put(make_page('кот', 'абв', data=[1, 'я']))
+    # Two bytes per Cyrillic letter, and the data as JSON: '[1, "я"]'
+    assert cache.size == 6 + 6 + 9
+    cache.put(make_page('кот', 'x'))
+    assert cache.size == 6 + 1
+    cache.invalidate(['кот', 'нет'])
+    assert cache.size == 0 and not cache.pages
+
+
+def test_eviction():
+    cache = PageCache(25)
+    for title in ('a', 'b', 'c'):
+        cache.put(make_page(title))
+    assert cache.size == 21
+    assert cache.get('a').title == 'a'
+    cache.put(make_page('d'))
+    assert list(cache.pages) == ['c', 'a', 'd']
+    assert cache.stats() == dict(hits=1, misses=0, evictions=1, pages=3, size=21, max_bytes=25)
+    assert cache.get('b') is None
+    cache.put(make_page('big', 'x' * 25))
+    assert cache.get('big') is None and cache.size == 21
+
+
+def test_copies():
+    cache = PageCache(1000)
+    page = make_page('a', data={'forms': ['x']})
+    cache.put(page)
+    page.data['forms'].append('y')
+    first = cache.get('a')
+    first.data['forms'].append('z')
+    assert cache.get('a').data == {'forms': ['x']}
+
+
+def test_threads():
+    cache = PageCache(5000)
+
+    def worker(offset):
+        for idx in range(2000):
+            title = str((offset + idx) % 300)
+            if cache.get(title) is None:
+                cache.put(make_page(title))
+
+    threads = [Thread(target=worker, args=(v * 7,)) for v in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.size == sum(size for _, _, size in cache.pages.values()) <= cache.max_bytes
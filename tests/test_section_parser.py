@@ -0,0 +1,60 @@
+import pytest
+from mwparserfromhell import parse as mw_parse
+
+from benchmarks.common import boilerplate
+from benchmarks.sections import foreign, make_page
+from lexicator.consts import re_section_headers
+from lexicator.tokenizer.SectionParser import SectionParser, clean_positions
+
+
+def matches(title):
+    return re_section_headers['ru'].search(str(title))
+
+
+ru = boilerplate % ('кот', 'кот')
+en = foreign % ('en', 'en', 'cat', 'cat')
+
+pages = {
+    'only ru': ru,
+    'ru among others': en + ru + foreign % ('de', 'de', 'Katze', 'Katze'),
+    'two ru sections': ru + en + ru,
+    'no ru': en,
+    'text before the first heading': '{{wikipedia}}\n[[Файл:Кот.jpg]]\n' + ru,
+    'heading in a template': en + '{{пример|\n' + ru + '}}\n' + ru,
+    'heading in a comment': en + '<!--\n' + ru + '-->\n' + ru,
+    'heading in nowiki': en + '<nowiki>\n' + ru + '</nowiki>\n' + ru,
+    'heading in a tag': en + '<div>\n' + ru + '</div>\n' + en,
+    'heading in a table': '{|\n|\n' + ru + '|}\n' + en,
+    'heading in a link': en + '[[Файл:Кот.jpg|\n' + ru + ']]\n',
+    'unclosed comment': en + '<!--\n' + ru,
+    'unclosed template': en + '{{пример|\n' + ru,
+    'unclosed nowiki': en + '<nowiki>\n' + ru,
+    'unclosed tag': en + '<span>\n' + ru + en,
+    'stray closing markup': en + '}} ]] </div>\n' + ru,
+    'self-closing tags': en + '<ref name="a" /><br>\n' + ru,
+    'unbalanced heading': '=== {{-ru-}} =\n' + ru[len('= {{-ru-}} =\n'):] + en,
+    'level 2 heading': '== {{-ru-}} ==\n' + ru[len('= {{-ru-}} =\n'):] + en,
+    'heading with a comment': '= {{-ru-}} = <!-- c -->\n' + ru[len('= {{-ru-}} =\n'):] + en,
+    'heading at the end': en + '= {{-ru-}} =',
+}
+
+
+@pytest.mark.parametrize('text', [*pages.values(), *(make_page(idx, None).content for idx in range(30))],
+                         ids=[*pages, *(f'synthetic {idx}' for idx in range(30))])
+def test_same_sections(text):
+    expected = mw_parse(text).get_sections(levels=[1], matches=matches, include_headings=False)
+    actual = SectionParser(matches).parse(text).get_sections(levels=[1], matches=matches, include_headings=False)
+    assert [str(v) for v in actual] == [str(v) for v in expected]
+
+
+def test_parses_less():
+    parser = SectionParser(matches)
+    parser.parse(pages['ru among others'])
+    assert 0 < parser.parsed[0] < parser.chars[0]
+    parser.parse(pages['no ru'])
+    assert parser.parsed[0] < parser.chars[0] - len(pages['no ru'])
+
+
+def test_clean_positions():
+    positions, clean = clean_positions('{{a|[[b]]}} <!-- {{ --> <nowiki>{{</nowiki> <span>x</span> {{c')
+    assert clean == [False, False, False, True, False, True, False, True, False, True, False]
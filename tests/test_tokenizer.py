@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.common import NullRetriever, boilerplate
+from lexicator.tokenizer import PageTokenizer
+from lexicator.wikicache import ContentStore, LogConfig
+from lexicator.wikicache.PageContent import PageContent
+from tests.retrievers import MemoryRetriever
+
+created = datetime(2020, 1, 1)
+template = PageContent(title='Шаблон:сущ ru m a', timestamp=created, ns=10, revid=1, content='{{сущ-ru|{{{1}}}|м 1a}}')
+alias = PageContent(title='Шаблон:сущ ru м a', timestamp=created, ns=10, revid=2, redirect=template.title,
+                    content=f'#перенаправление [[{template.title}]]')
+word = PageContent(title='кот', timestamp=created, ns=0, revid=3,
+                   content=boilerplate.replace('{{сущ-ru|%s|м 1a}}', '{{сущ ru м a|%s}}') % ('кот', 'кот'))
+
+
+@pytest.fixture
+def stores(tmp_path):
+    templates = ContentStore(tmp_path / 'templates.db', MemoryRetriever([template, alias]))
+    templates.refresh()
+    words = ContentStore(tmp_path / 'words.db', NullRetriever())
+    words.save_pages([word])
+    words.set_last_change(created)
+    parsed = ContentStore(tmp_path / 'parsed.db', PageTokenizer('ru', words, templates, LogConfig()),
+                          skip_unchanged=True, depends_on=templates)
+    parsed.refresh()
+    return templates, parsed
+
+
+def test_redirect_dependencies(stores):
+    _, parsed = stores
+    page = parsed.get('кот')
+    assert ([None, 'Морфологические и синтаксические свойства'], 'сущ-ru', {'1': 'кот', '2': 'м 1a'}) in \
+           [tuple(v) for v in page.data]
+    with parsed.read_session() as reader:
+        rows = reader.query(parsed.DependencyDb.dependency).filter(parsed.DependencyDb.title == 'кот')
+        assert sorted(v[0] for v in rows) == [template.title, alias.title]
+
+
+def test_redirect_target_edit(stores):
+    templates, parsed = stores
+    templates.retriever.edit(PageContent(title=template.title, timestamp=datetime(2020, 2, 1), ns=10, revid=4,
+                                         content='{{сущ-ru|{{{1}}}|ж 8a}}'))
+    templates.refresh()
+    assert parsed.find_marked_titles() == ['кот']
+    parsed.refresh()
+    assert parsed.find_marked_titles() == []
+    assert {'1': 'кот', '2': 'ж 8a'} in [v[2] for v in parsed.get('кот').data]
+
+
+def test_cached_expansions(tmp_path):
+    templates = ContentStore(tmp_path / 'templates.db', MemoryRetriever([
+        PageContent(title='Шаблон:сущ ru m a', timestamp=created, ns=10, revid=1,
+                    content='{{сущ ru основа|{{{1}}}}}{{нет такого}}'),
+        PageContent(title='Шаблон:сущ ru основа', timestamp=created, ns=10, revid=2, content='{{сущ-ru|{{{1}}}|м 1a}}'),
+        PageContent(title='Шаблон:сущ ru имя', timestamp=created, ns=10, revid=3,
+                    content='{{сущ-ru|{{PAGENAME}}|ж 8a}}')]))
+    templates.refresh()
+    content = boilerplate.replace('{{сущ-ru|%s|м 1a}}', '{{сущ ru m a|x}}\n{{сущ ru имя}}') % 'x'
+    pages = [PageContent(title=v, timestamp=created, ns=0, content=content) for v in ('кот', 'пёс')]
+
+    cached = PageTokenizer('ru', None, templates, LogConfig())
+    results = [cached.process_page(page, False) for page in pages]
+    assert cached.expansions.hits == 1 and cached.expansions.uncacheable == 2
+    for page, result in zip(pages, results):
+        # Expanding every template again gives the same results, warnings, and dependencies
+        expected = PageTokenizer('ru', None, templates, LogConfig()).process_page(page, True)
+        assert (result.data, result.content, result.dependencies) == \
+               (expected.data, expected.content, expected.dependencies)
+    assert ('сущ-ru', {'1': 'пёс', '2': 'ж 8a'}) in [tuple(v[1:]) for v in results[1].data]
+    assert 'Template нет такого is not known' in results[1].content
+    assert 'Шаблон:нет такого' in results[1].dependencies
@@ -0,0 +1,52 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from lexicator.wikicache import ContentStore, TemplateDownloader, WiktionaryWordDownloader, import_xml_dump, \
+    LogConfig, XmlDumpReader
+
+fixture = Path(__file__).parent / 'fixtures' / 'pages-articles.xml.bz2'
+
+
+@pytest.fixture
+def stores(tmp_path):
+    words = ContentStore(tmp_path / 'words.db', WiktionaryWordDownloader(None, LogConfig()))
+    templates = ContentStore(tmp_path / 'templates.db', TemplateDownloader(None, log_config=LogConfig()))
+    import_xml_dump(fixture, [words, templates], batch_size=2)
+    return words, templates
+
+
+def test_last_revision(stores):
+    words, _ = stores
+    page = words.get('слово')
+    assert page.revid == 1002
+    assert page.timestamp == datetime(2020, 2, 1, 10, 0)
+    assert page.user == 'Второй'
+    assert page.content == '= {{-ru-}} =\n{{сущ-ru|слово|с 1a}}'
+    page = words.get('кот')
+    assert (page.revid, page.timestamp, page.user) == (1003, datetime(2020, 3, 15, 12, 30), '192.0.2.1')
+
+
+def test_namespace_routing(stores):
+    words, templates = stores
+    assert sorted(v.title for v in words.iter_rows()) == ['кот', 'слово']
+    assert sorted(v.title for v in templates.iter_rows()) == ['Шаблон:сущ ru', 'Шаблон:сущ-ru']
+    template = templates.get('Шаблон:сущ-ru')
+    assert (template.revid, template.user, template.content) == (2001, 'Шаблонщик', '{{{1}}}')
+    with pytest.raises(KeyError):
+        words.get('Категория:Существительные')
+
+
+def test_last_change(stores):
+    # The newest revision in the whole dump, including the namespaces that were not imported
+    for store in stores:
+        assert store.get_last_change() == datetime(2020, 4, 1)
+
+
+def test_max_timestamp():
+    reader = XmlDumpReader(fixture)
+    pages = list(reader)
+    assert [v.ns for v in pages] == [0, 0, 0, 10, 10, 14]
+    assert pages[2].redirect == 'слово'
+    assert reader.max_timestamp.replace(tzinfo=None) == datetime(2020, 4, 1)